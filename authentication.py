@@ -0,0 +1,70 @@
+"""Provides asynchronous password hashing for the login path.
+
+Hashing happens in a dedicated, size-limited thread pool so the reactor is
+never blocked by passlib. Attempts beyond the pool size wait in a bounded
+queue. Once that queue is full new attempts fail straight away with
+AuthenticationBusy."""
+
+import logging
+from twisted.internet import reactor
+from twisted.internet.defer import DeferredSemaphore, fail
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+from config import config
+from db.base import encrypt_password, verify_password
+
+__all__ = ['AuthenticationBusy', 'verify', 'encrypt']
+logger = logging.getLogger(__name__)
+
+pool = None
+semaphore = None
+
+
+class AuthenticationBusy(Exception):
+    """Too many authentication attempts are already waiting."""
+
+
+def get_pool():
+    """Return the password thread pool, starting it if necessary."""
+    global pool, semaphore
+    if pool is None:
+        threads = max(1, config.password_threads)
+        logger.info('Starting password pool with %d threads.', threads)
+        pool = ThreadPool(minthreads=0, maxthreads=threads, name=__name__)
+        semaphore = DeferredSemaphore(threads)
+        pool.start()
+        reactor.addSystemEventTrigger('during', 'shutdown', stop_pool)
+    return pool
+
+
+def stop_pool():
+    """Stop the password thread pool."""
+    global pool, semaphore
+    if pool is not None:
+        logger.info('Stopping password pool.')
+        pool.stop()
+        pool = None
+        semaphore = None
+
+
+def run(func, *args):
+    """Run func with args in the password pool, returning a Deferred. If too
+    many attempts are already queued the Deferred fails with
+    AuthenticationBusy."""
+    p = get_pool()
+    if len(semaphore.waiting) >= config.password_queue_size:
+        logger.warning(
+            'Password queue full (%d waiting).', len(semaphore.waiting)
+        )
+        return fail(AuthenticationBusy())
+    return semaphore.run(deferToThreadPool, reactor, p, func, *args)
+
+
+def verify(secret, hash):
+    """Return a Deferred which fires with True if secret matches hash."""
+    return run(verify_password, secret, hash)
+
+
+def encrypt(secret):
+    """Return a Deferred which fires with the hash of secret."""
+    return run(encrypt_password, secret)
@@ -0,0 +1,59 @@
+"""Compare how long it takes to parse command lines with argparse and with the
+fast parser."""
+
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from contextlib import redirect_stdout, redirect_stderr
+from io import StringIO
+from shlex import split
+from time import time
+import config
+config.config = config.Config()
+
+parser = ArgumentParser(
+    description=__doc__, formatter_class=ArgumentDefaultsHelpFormatter
+)
+parser.add_argument(
+    '-n', '--number', type=int, default=100000,
+    help='The number of times to parse each line'
+)
+parser.add_argument(
+    'lines', nargs='*', default=[
+        'say Hello everyone, how are you today?', 'go north', 'look',
+        'emote waves.'
+    ], help='The command lines to parse'
+)
+
+
+def slow(cmd, text):
+    """Parse text the way commands used to: splitting it with shlex, parsing
+    it with argparse, and capturing anything printed."""
+    f = StringIO()
+    with redirect_stdout(f), redirect_stderr(f):
+        return cmd.parse_args(split(text))
+
+
+def fast(cmd, text):
+    """Parse text the way commands do now."""
+    return cmd.parse_text(text)
+
+
+def main(args):
+    from networking import commands_table
+    for line in args.lines:
+        name, _, text = line.partition(' ')
+        cmd = commands_table[name]
+        timings = []
+        for func in (slow, fast):
+            started = time()
+            for x in range(args.number):
+                func(cmd, text)
+            timings.append((time() - started) / args.number * 1000000)
+        print(
+            f'{line}: {timings[0]:.2f} microseconds with argparse, '
+            f'{timings[1]:.2f} with the fast parser '
+            f'({timings[0] / timings[1]:.1f}x faster).'
+        )
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
@@ -0,0 +1,51 @@
+"""Search the command log."""
+
+from argparse import ArgumentParser
+from datetime import datetime
+import config
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument(
+    '-c', '--config-file', default='game.yaml',
+    help='The configuration file which names the command log'
+)
+parser.add_argument(
+    '-f', '--file', help='The command log to search (overrides the '
+    'configuration)'
+)
+parser.add_argument(
+    'character', nargs='?',
+    help='Only show commands from the character with this name or id'
+)
+parser.add_argument(
+    '-s', '--since', type=datetime.fromisoformat,
+    help='Only show commands typed from this time (YYYY-MM-DD[ HH:MM[:SS]])'
+)
+parser.add_argument(
+    '-u', '--until', type=datetime.fromisoformat,
+    help='Only show commands typed up to this time'
+)
+
+
+def main(args):
+    config.config = config.Config.load(args.config_file)
+    from command_log import search
+    character = args.character
+    if character is not None and character.isdigit():
+        character = int(character)
+    n = 0
+    for entry in search(
+        path=args.file, character=character,
+        since=args.since and args.since.timestamp(),
+        until=args.until and args.until.timestamp()
+    ):
+        n += 1
+        when = datetime.fromtimestamp(entry['time']).isoformat(
+            ' ', 'seconds'
+        )
+        print(f'{when} {entry["name"]} (#{entry["id"]}): {entry["command"]}')
+    print(f'Commands found: {n}.')
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
@@ -0,0 +1,213 @@
+"""Writes the commands typed by logged characters to a log of their own.
+
+Commands used to be stored in the game database, where they grew the world
+forever and were written out with every dump. Instead, log queues each line,
+and a background thread appends them to config.command_log_file, one JSON
+object per line, a batch at a time. The reactor thread never touches the
+file, and if more than config.command_log_queue_size lines are waiting, any
+more are dropped and counted.
+
+Once the file grows past config.command_log_max_size bytes, it is compressed
+with gzip, renamed after the time it was rotated, and a new file is started.
+Only the newest config.command_log_backups compressed files are kept.
+
+Use search (or command-log.py) to find logged commands by character and time
+range."""
+
+import gzip
+import json
+import logging
+import os
+import shutil
+from collections import Counter
+from datetime import datetime
+from glob import glob
+from queue import Queue, Empty, Full
+from threading import Thread
+from time import time, monotonic
+from config import config
+
+__all__ = ['log', 'search', 'start', 'stop']
+logger = logging.getLogger(__name__)
+
+# The format of the times in the names of rotated files.
+time_format = '%Y%m%d-%H%M%S-%f'
+
+# Lines waiting to be written. Created by start.
+queue = None
+
+# The thread writing lines.
+writer = None
+
+# Counts lines written, batches written and files rotated. Lines dropped
+# because the queue was full are counted by the reactor thread as dropped, and
+# lines which could not be written are counted by the writer as unwritten, so
+# no count is updated from two threads.
+stats = Counter()
+
+
+def log(id, name, command):
+    """Queue command, typed by the character with the given id and name, to
+    be written to the log. Never blocks."""
+    if writer is None:
+        start()
+    try:
+        queue.put_nowait(
+            dict(time=time(), id=id, name=name, command=command)
+        )
+    except Full:
+        stats['dropped'] += 1
+
+
+class Writer(Thread):
+    """Write queued lines to the command log."""
+
+    def __init__(self, queue):
+        super().__init__(name=__name__, daemon=True)
+        self.queue = queue
+        self.path = config.command_log_file
+        self.stream = None
+        self.lost = 0  # Already reported.
+
+    def run(self):
+        while True:
+            entries = self.gather()
+            if entries and entries[-1] is None:
+                self.write(entries[:-1])
+                break
+            self.write(entries)
+        if self.stream is not None:
+            self.stream.close()
+
+    def gather(self):
+        """Return the next batch of entries, waiting at most
+        config.command_log_interval seconds once the first has arrived. A
+        batch ending with None means the writer should stop."""
+        entries = [self.queue.get()]
+        deadline = monotonic() + config.command_log_interval
+        while entries[-1] is not None and (
+            len(entries) < config.command_log_batch
+        ):
+            try:
+                entries.append(
+                    self.queue.get(timeout=max(0, deadline - monotonic()))
+                )
+            except Empty:
+                break
+        return entries
+
+    def write(self, entries):
+        """Append entries to the log, rotating it if it has grown too
+        big."""
+        if entries:
+            try:
+                if self.stream is None:
+                    self.stream = open(self.path, 'a')
+                self.stream.write(
+                    ''.join(json.dumps(entry) + '\n' for entry in entries)
+                )
+                self.stream.flush()
+                if config.command_log_sync:
+                    os.fsync(self.stream.fileno())
+                stats['written'] += len(entries)
+                stats['batches'] += 1
+                if config.command_log_max_size and (
+                    self.stream.tell() >= config.command_log_max_size
+                ):
+                    self.rotate()
+            except OSError as e:
+                stats['unwritten'] += len(entries)
+                logger.warning('Could not write to the command log: %s', e)
+        lost = stats['dropped'] + stats['unwritten']
+        if lost > self.lost:
+            logger.warning(
+                'Dropped %d commands from the command log.', lost - self.lost
+            )
+            self.lost = lost
+
+    def rotate(self):
+        """Compress the current file and start a new one."""
+        self.stream.close()
+        self.stream = None
+        rotated = f'{self.path}.{datetime.now().strftime(time_format)}.gz'
+        with open(self.path, 'rb') as f, gzip.open(rotated, 'wb') as g:
+            shutil.copyfileobj(f, g)
+        os.remove(self.path)
+        stats['rotations'] += 1
+        for filename in rotated_files(self.path)[
+            :-config.command_log_backups or None
+        ]:
+            os.remove(filename)
+
+
+def rotated_files(path):
+    """Return the names of the files rotated from path, oldest first."""
+    return sorted(glob(f'{glob_escape(path)}.*.gz'))
+
+
+def glob_escape(path):
+    """Escape the special characters in path for glob."""
+    return ''.join(f'[{c}]' if c in '*?[' else c for c in path)
+
+
+def rotation_time(filename):
+    """Return the time filename was rotated, as a timestamp."""
+    return datetime.strptime(
+        filename.rsplit('.', 2)[-2], time_format
+    ).timestamp()
+
+
+def start():
+    """Start the writer thread."""
+    global queue, writer
+    from twisted.internet import reactor
+    queue = Queue(max(1, config.command_log_queue_size))
+    writer = Writer(queue)
+    writer.start()
+    reactor.addSystemEventTrigger('during', 'shutdown', stop)
+
+
+def stop():
+    """Write any waiting lines, and stop the writer thread."""
+    global writer
+    if writer is not None:
+        # Wait rather than drop, since the writer is still emptying the
+        # queue.
+        queue.put(None)
+        writer.join()
+        writer = None
+
+
+def search(path=None, character=None, since=None, until=None):
+    """Yield entries from the command log at path (config.command_log_file
+    by default), oldest first. Only entries from character (a name, matched
+    case-insensitively, or an id) between the timestamps since and until are
+    included."""
+    if path is None:
+        path = config.command_log_file
+    if isinstance(character, str):
+        character = character.lower()
+    filenames = rotated_files(path)
+    if os.path.isfile(path):
+        filenames.append(path)
+    for filename in filenames:
+        if filename == path:
+            f = open(filename, 'r')
+        elif since is not None and rotation_time(filename) < since:
+            continue  # Everything in this file is too old.
+        else:
+            f = gzip.open(filename, 'rt')
+        with f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Probably a partial line written as we crashed.
+                if since is not None and entry['time'] < since:
+                    continue
+                if until is not None and entry['time'] > until:
+                    continue
+                if character is None or character in (
+                    entry['id'], entry['name'].lower()
+                ):
+                    yield entry
@@ -0,0 +1,30 @@
+"""Finds the game's commands.
+
+Every module in this package (apart from base) is imported by discover, and
+the Command subclasses it defines are made available from this package."""
+
+from importlib import import_module
+from inspect import isclass
+from pkgutil import iter_modules
+from .base import Command
+
+__all__ = ['discover']
+
+
+def discover():
+    """Import every command module, returning the Command subclasses they
+    define, sorted by name."""
+    classes = []
+    for info in iter_modules(__path__):
+        if info.name == 'base':
+            continue
+        module = import_module(f'{__name__}.{info.name}')
+        for name, cls in vars(module).items():
+            if isclass(cls) and issubclass(cls, Command) and (
+                cls.__module__ == module.__name__
+            ):
+                globals()[name] = cls
+                if name not in __all__:
+                    __all__.append(name)
+                classes.append(cls)
+    return sorted(classes, key=lambda cls: cls.__name__)
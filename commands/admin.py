@@ -1,14 +1,16 @@
 """Administrative commands."""
 
 import logging
-from programming import manage_environment, as_function
+import db.engine
+from programming import as_function, hot_scripts, profile, exhausted
 from intercepts import Intercept
 from db import Character, Race, Room, RoomCommand, Session as s
 from db.base import Base, Code, Message as _Message, single_match
 from config import config
 from permissions import check_programmer
 from .base import Command
-from socials import socials
+from socials import get_strings
+from game_clock import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +33,14 @@ class Eval(Command):
 
     def func(self, character, args, text):
         try:
-            with manage_environment(
-                character=character, here=character.location
-            ) as lua:
-                character.notify(repr(lua.eval(text)))
+            character.notify(
+                repr(
+                    as_function(
+                        f'return {text}', character=character,
+                        here=character.location
+                    )
+                )
+            )
         except Exception as e:
             character.notify(str(e))
             logger.exception(e)
@@ -296,7 +302,7 @@ class Teleport(Command):
         if r is None:
             self.exit(message='Invalid room id.')
         character.do_social(character.teleport_leave_msg)
-        msg = socials.get_strings(
+        msg = get_strings(
             character.teleport_arrive_msg, [character]
         )[-1]
         r.broadcast(msg)
@@ -347,3 +353,124 @@ class Log_Commands(Command):
             'Command logging turned %s for %s by %s.',
             'on' if who.log_commands else 'off', who, character
         )
+
+
+class Statements(Command):
+    """Show how many SQL statements your recent commands have used."""
+
+    def on_init(self):
+        self.admin = True
+        self.aliases.extend(['@statements', '@sql'])
+        self.add_argument(
+            '-r', '--refresh', action='store_true',
+            help='Reload everything your connection has cached first'
+        )
+
+    def func(self, character, args, text):
+        con = character.connection
+        if args.refresh:
+            con.refresh()
+            character.notify('Connection session refreshed.')
+        counts = con.statements
+        if counts:
+            character.notify(
+                f'Last {len(counts)} lines: {counts[-1]} statements for the '
+                f'last line, {sum(counts) / len(counts):.1f} on average, '
+                f'{max(counts)} at most.'
+            )
+        character.notify(
+            f'Statements since startup: {db.engine.statements}.'
+        )
+
+
+class Scripts(Command):
+    """Show which scripts are using the most time."""
+
+    def on_init(self):
+        self.admin = True
+        self.aliases.extend(['@scripts', '@profile'])
+        self.add_argument(
+            '-s', '--sort', default='total',
+            choices=['total', 'calls', 'average', 'p99', 'errors'],
+            help='What to sort scripts by'
+        )
+        self.add_argument(
+            '-n', '--number', type=int, default=10,
+            help='The number of scripts to show'
+        )
+        self.add_argument(
+            '-c', '--clear', action='store_true',
+            help='Forget all timings once they have been shown'
+        )
+
+    def func(self, character, args, text):
+        if not config.lua_profile:
+            return character.notify('Script profiling is turned off.')
+        scripts = hot_scripts(key=args.sort, number=args.number)
+        if not scripts:
+            character.notify('No scripts have run yet.')
+        for name, stats in scripts:
+            character.notify(
+                f'{name}: {stats.calls} calls ({stats.errors} errors, '
+                f'{exhausted[name]} over budget), '
+                f'{stats.total * 1000:.1f} ms total, '
+                f'{stats.average * 1000:.2f} ms average, '
+                f'{stats.p99 * 1000:.2f} ms p99.'
+            )
+        if args.clear:
+            profile.clear()
+            exhausted.clear()
+            character.notify('Timings cleared.')
+
+
+class Log_Level(Command):
+    """Show or change which log messages you see."""
+
+    levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL', 'OFF']
+
+    def on_init(self):
+        self.admin = True
+        self.aliases.append('@log-level')
+        self.add_argument(
+            'level', nargs='?', type=str.upper, choices=self.levels,
+            help='The lowest level of message to show'
+        )
+
+    def func(self, character, args, text):
+        from log_handler import LogHandler
+        con = character.connection
+        if args.level == 'OFF':
+            con.log_level = logging.CRITICAL + 1
+        elif args.level is not None:
+            con.log_level = logging.getLevelName(args.level)
+        if con.log_level > logging.CRITICAL:
+            character.notify('You will not see log messages.')
+        else:
+            character.notify(
+                'You will see log messages of level '
+                f'{logging.getLevelName(con.log_level)} and above.'
+            )
+        for handler in logging.getLogger().handlers:
+            if isinstance(handler, LogHandler):
+                character.notify(
+                    f'Log messages dropped: {handler.total_dropped}.'
+                )
+
+
+class Clock(Command):
+    """Show the state of the game clock."""
+
+    def on_init(self):
+        self.admin = True
+        self.aliases.append('@clock')
+
+    def func(self, character, args, text):
+        m = metrics()
+        character.notify(
+            f'Timers waiting: {m["timers"]}. Timers fired: {m["fired"]}.'
+        )
+        character.notify(
+            f'Ticks: {m["ticks"]} of {config.clock_resolution} seconds, '
+            f'{m["late_ticks"]} late. Lag: {m["lag"] * 1000:.1f} ms, '
+            f'{m["max_lag"] * 1000:.1f} ms at most.'
+        )
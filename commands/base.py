@@ -2,21 +2,121 @@
 
 import logging
 import sys
-from contextlib import redirect_stdout, redirect_stderr
-from io import StringIO
 from shlex import split
-from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from argparse import (
+    ArgumentParser, ArgumentDefaultsHelpFormatter, ArgumentTypeError,
+    Namespace, SUPPRESS, _StoreAction
+)
 from db import MatchError, CantMoveError
+from programming import BudgetExceeded
 
 logger = logging.getLogger(__name__)
 
+# Lines containing any of these characters must be split with shlex.
+quote_characters = frozenset('\'"\\')
+
+# The minimum and maximum number of values taken by each nargs the fast
+# parser understands. None means there is no maximum.
+nargs_counts = {None: (1, 1), '?': (0, 1), '*': (0, None), '+': (1, None)}
+
 
 class CommandExit(Exception):
     """A command exited for some reason."""
 
 
+class FastParser:
+    """Parse simple command lines without argparse.
+
+    Built from the arguments a command declares. Lines without quotes or
+    options are parsed here, so long as every positional argument is stored
+    with a simple nargs, and at most one of them takes a variable number of
+    values. Anything else, including any line argparse would reject, returns
+    None so argparse can deal with it, and print its usual help and
+    errors."""
+
+    def __init__(self, command):
+        self.defaults = {}
+        self.positionals = []
+        self.variable = None
+        self.usable = True
+        for action in command._actions:
+            if action.option_strings:
+                if SUPPRESS not in (action.dest, action.default):
+                    self.defaults[action.dest] = action.default
+            elif type(action) is _StoreAction and action.nargs in nargs_counts:
+                self.positionals.append(action)
+                minimum, maximum = nargs_counts[action.nargs]
+                if minimum != maximum:
+                    if self.variable is not None:
+                        self.usable = False
+                    self.variable = action
+            else:
+                self.usable = False
+        self.fixed = len(self.positionals) - (self.variable is not None)
+
+    def convert(self, action, strings):
+        """Return strings converted with the type of action, or None if any of
+        them are invalid."""
+        values = []
+        for string in strings:
+            if action.type is not None:
+                try:
+                    string = action.type(string)
+                except (TypeError, ValueError, ArgumentTypeError):
+                    return None
+            if action.choices is not None and string not in action.choices:
+                return None
+            values.append(string)
+        return values
+
+    def parse(self, text):
+        """Return a Namespace made from text, or None if argparse should parse
+        it instead."""
+        if not self.usable or not quote_characters.isdisjoint(text):
+            return None
+        words = text.split()
+        for word in words:
+            if word.startswith('-'):
+                return None
+        extra = len(words) - self.fixed
+        if self.variable is None:
+            if extra:
+                return None
+        else:
+            minimum, maximum = nargs_counts[self.variable.nargs]
+            if extra < minimum or (maximum is not None and extra > maximum):
+                return None
+        args = Namespace(**self.defaults)
+        start = 0
+        for action in self.positionals:
+            count = extra if action is self.variable else 1
+            values = self.convert(action, words[start:start + count])
+            if values is None:
+                return None
+            start += count
+            if action.nargs is None:
+                value = values[0]
+            elif action.nargs == '?':
+                if values:
+                    value = values[0]
+                else:
+                    value = action.default
+                    if isinstance(value, str) and action.type is not None:
+                        value = action.type(value)
+            elif not values and action.default is not None:
+                value = action.default
+            else:
+                value = values
+            setattr(args, action.dest, value)
+        return args
+
+
 class Command(ArgumentParser):
-    """Overwrite stupid methods."""
+    """Overwrite stupid methods.
+
+    Creating a command only runs on_init: calls to add_argument are
+    remembered, and the parser itself is built by the build method the first
+    time it is needed."""
 
     def __init__(self, *args, **kwargs):
         kwargs.setdefault(
@@ -24,49 +124,87 @@ class Command(ArgumentParser):
         )
         kwargs.setdefault('formatter_class', ArgumentDefaultsHelpFormatter)
         kwargs.setdefault('description', self.__doc__)
-        super().__init__(*args, **kwargs)
+        self.parser_args = (args, kwargs)
+        self.arguments = []
+        self.built = False
+        self.fast_parser = None
+        self.prog = kwargs['prog']
+        self.description = kwargs['description']
         self.builder = False
         self.admin = False
         self.programmer = False
         self.aliases = []
+        self.character = None
         self.on_init()
 
+    def __repr__(self):
+        # ArgumentParser.__repr__ needs attributes which are only set once
+        # the parser has been built.
+        return f'{self.__class__.__name__}(prog={self.prog!r})'
+
     def on_init(self):
         """Called after __init__, avoiding all that super rubbish."""
 
+    def add_argument(self, *args, **kwargs):
+        """Remember arguments until the parser is built."""
+        if self.built:
+            return super().add_argument(*args, **kwargs)
+        self.arguments.append((args, kwargs))
+
+    def build(self):
+        """Build the parser if that hasn't been done yet."""
+        if not self.built:
+            self.built = True
+            args, kwargs = self.parser_args
+            super().__init__(*args, **kwargs)
+            for args, kwargs in self.arguments:
+                super().add_argument(*args, **kwargs)
+            self.fast_parser = FastParser(self)
+
     def _print_message(self, message, file=None):
-        """Always print to sys.stdout."""
-        sys.stdout.write(message)
+        """Send message to the character running this command, or print it to
+        sys.stdout if there isn't one."""
+        if self.character is None:
+            sys.stdout.write(message)
+        else:
+            self.character.notify(message.rstrip('\n'))
 
     def exit(self, status=0, message=None):
         """Don't exit the program."""
         if message:
-            sys.stdout.write(message)
+            self._print_message(message)
         raise CommandExit()
 
-    def run(self, character, text):
-        """Call with a Character instance and the text from the command line with the
-        command name excluded."""
-        f = StringIO()
-        with redirect_stdout(f), redirect_stderr(f):
+    def parse_text(self, text):
+        """Return the arguments found in text, using argparse only when the
+        fast parser can't cope."""
+        self.build()
+        args = self.fast_parser.parse(text)
+        if args is None:
             try:
                 cmd = split(text)
             except ValueError:  # Probably unbalanced quotation marks.
                 cmd = text
-            try:
-                args = self.parse_args(cmd)
-                self.func(character, args, text)
-            except CommandExit:
-                pass  # That's OK.
-            except (CantMoveError, MatchError) as e:
-                character.notify(*e.args)
-            except Exception as e:
-                logger.warning('Error in %r:', self)
-                logger.exception(e)
-                raise
-            finally:
-                f.seek(0)
-                character.notify(f.read())
+            args = self.parse_args(cmd)
+        return args
+
+    def run(self, character, text):
+        """Call with a Character instance and the text from the command line with the
+        command name excluded."""
+        previous = self.character
+        self.character = character
+        try:
+            self.func(character, self.parse_text(text), text)
+        except CommandExit:
+            pass  # That's OK.
+        except (CantMoveError, MatchError, BudgetExceeded) as e:
+            character.notify(*e.args)
+        except Exception as e:
+            logger.warning('Error in %r:', self)
+            logger.exception(e)
+            raise
+        finally:
+            self.character = previous
 
     def func(self, character, args, text):
         """Override to provide a meaningful command."""
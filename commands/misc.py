@@ -21,7 +21,7 @@ class Quit(Command):
             character.notify('This command takes no arguments.')
         else:
             character.notify('See you soon.')
-            character.connection.transport.loseConnection()
+            character.connection.disconnect()
 
 
 class Password(Command):
@@ -157,9 +157,7 @@ class Look(Command):
             msg = f'{character.name} looks around.'
         else:
             msg = f'{character.name} looks at {obj.name}.'
-        for char in character.location.characters:
-            if char is not character:
-                char.notify(msg)
+        character.location.broadcast(msg, exclude=character)
 
 
 class Exits(Command):
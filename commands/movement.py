@@ -1,9 +1,9 @@
 """Movement commands."""
 
 from .base import Command
-from db import Direction
-from socials import socials
-from programming import as_function
+from db.cache import get_direction
+from socials import get_strings
+from programming import call_program
 
 
 class Go(Command):
@@ -19,18 +19,18 @@ class Go(Command):
             self.exit(message='You cannot go that way.')
         if character.resting:
             self.exit(message='You must stand up first.')
-        if x.can_use is not None and not as_function(
-            x.can_use, character=character
+        if x.can_use is not None and not call_program(
+            x, 'can_use', character=character
         ):
             return  # They cannot pass.
         character.do_social(
             x.use_msg.format(character.walk_style), _others=[x]
         )
-        d = Direction.query(name=x.name).first()
+        d = get_direction(x.name)
         if d is None:
             msg = f'{character.name} arrives.'
         else:
-            msg = socials.get_strings(
+            msg = get_strings(
                 x.arrive_msg, [character], direction=d.opposite_string
             )
         x.target.broadcast(msg[-1])
@@ -16,8 +16,66 @@ class Config:
     port = attrib(default=Factory(lambda: 4000))
     interface = attrib(default=Factory(lambda: '0.0.0.0'))
     motd = attrib(default=Factory(lambda: 'Message of the day goes here'))
+    db_url = attrib(default=Factory(lambda: 'sqlite:///:memory:'))
+    sqlite_pragmas = attrib(
+        default=Factory(
+            lambda: {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+                'cache_size': -65536,  # 64 MB.
+                'mmap_size': 268435456,  # 256 MB.
+                'temp_store': 'MEMORY'
+            }
+        )
+    )
+    db_pool_size = attrib(default=Factory(lambda: 5))
+    db_max_overflow = attrib(default=Factory(lambda: 10))
+    db_pool_timeout = attrib(default=Factory(lambda: 30))
+    db_pool_recycle = attrib(default=Factory(lambda: 1800))
+    db_threads = attrib(default=Factory(lambda: 4))
     db_file = attrib(default=Factory(lambda: 'world.yaml'))
+    journal_file = attrib(default=Factory(lambda: 'world.journal'))
+    journal_sync = attrib(default=Factory(bool))
+    snapshot_file = attrib(default=Factory(lambda: 'world.sqlite'))
+    snapshot_interval = attrib(default=Factory(lambda: 300))
+    snapshot_pages = attrib(default=Factory(lambda: 256))
     new_character_command = attrib(default=Factory(lambda: 'new'))
+    password_threads = attrib(default=Factory(lambda: 4))
+    password_queue_size = attrib(default=Factory(lambda: 50))
+    lua_cache_size = attrib(default=Factory(lambda: 1000))
+    lua_instructions = attrib(default=Factory(lambda: 1000000))
+    lua_time = attrib(default=Factory(lambda: 0.25))
+    lua_memory = attrib(default=Factory(lambda: 8 * 1024 * 1024))
+    lua_max_memory = attrib(default=Factory(lambda: 256 * 1024 * 1024))
+    lua_hook_step = attrib(default=Factory(lambda: 1000))
+    lua_processes = attrib(default=Factory(int))
+    lua_profile = attrib(default=Factory(lambda: True))
+    lua_profile_samples = attrib(default=Factory(lambda: 200))
+    lua_profile_interval = attrib(default=Factory(lambda: 3600))
+    lua_profile_log_size = attrib(default=Factory(lambda: 5))
+    lua_profile_size = attrib(default=Factory(lambda: 1000))
+    dns_concurrency = attrib(default=Factory(lambda: 10))
+    dns_cache_size = attrib(default=Factory(lambda: 10000))
+    dns_ttl = attrib(default=Factory(lambda: 3600))
+    dns_negative_ttl = attrib(default=Factory(lambda: 300))
+    dns_timeout = attrib(default=Factory(lambda: 5))
+    output_buffer_size = attrib(default=Factory(lambda: 256 * 1024))
+    output_overflow = attrib(default=Factory(lambda: 'disconnect'))
+    admin_log_level = attrib(default=Factory(lambda: 'INFO'))
+    log_queue_size = attrib(default=Factory(lambda: 1000))
+    social_cache_size = attrib(default=Factory(lambda: 1000))
+    command_log_file = attrib(default=Factory(lambda: 'commands.log'))
+    command_log_max_size = attrib(default=Factory(lambda: 10 * 1024 * 1024))
+    command_log_backups = attrib(default=Factory(lambda: 10))
+    command_log_queue_size = attrib(default=Factory(lambda: 10000))
+    command_log_batch = attrib(default=Factory(lambda: 500))
+    command_log_interval = attrib(default=Factory(lambda: 1.0))
+    command_log_sync = attrib(default=Factory(bool))
+    clock_resolution = attrib(default=Factory(lambda: 0.1))
+    clock_slots = attrib(default=Factory(lambda: 256))
+    clock_levels = attrib(default=Factory(lambda: 4))
+    regain_interval = attrib(default=Factory(lambda: 10))
+    idle_timeout = attrib(default=Factory(lambda: 3600))
     command_substitutions = attrib(
         default=Factory(
             lambda: {
@@ -0,0 +1,23 @@
+"""Convert a world file from one format to another."""
+
+from argparse import ArgumentParser
+import config
+config.config = config.Config()
+
+parser = ArgumentParser(description=__doc__)
+parser.add_argument('source', help='The world file to read')
+parser.add_argument('destination', help='The world file to write')
+
+
+def main(args):
+    from db import get_classes, journal
+    from db.formats import load_world, dump_world
+    classes = get_classes()
+    # Carry the journal sequence number over so the journal still applies.
+    journal.sequence = load_world(args.source, classes)
+    n = dump_world(args.destination, classes, journal.sequence)
+    print(f'Converted {args.source} to {args.destination}: {n} rows.')
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
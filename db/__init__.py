@@ -3,10 +3,9 @@
 import logging
 import os
 from inspect import isclass
-from sqlalchemy import inspect
-from yaml import load, dump
 from pyperclip import copy, PyperclipException
-from db_dumper import load as dumper_load, dump as dumper_dump
+from sqlalchemy import func, select
+from sqlalchemy.schema import CreateIndex
 from config import config
 
 # Database-specific stuff:
@@ -14,10 +13,16 @@ from .session import Session, session
 from .rooms import Room, Direction, Exit, Zone, RoomCommand
 from .guilds import Guild, GuildSecondary
 from .genders import Gender
-from .characters import Character, Race, LoggedCommand, CantMoveError
+from .characters import Character, Race, CantMoveError
 from .objects import Object
 from .base import Base, MatchError, single_match
 from .skills import WeaponSkill, WeaponSkillSecondary, Spell, SpellSecondary
+from .formats import (  # noqa
+    load_world, dump_world, dump_object, read_sequence
+)
+from .engine import persistent, url
+from .engine import engine as _engine
+from . import journal, snapshots, cache
 
 
 logger = logging.getLogger(__name__)
@@ -27,7 +32,7 @@ __all__ = [
     'dump_db', 'load_db', 'get_classes', 'Guild', 'GuildSecondary',
     'WeaponSkill', 'WeaponSkillSecondary', 'Spell', 'SpellSecondary', 'Gender',
     'Direction', 'Zone', 'Race', 'RoomCommand', 'MatchError', 'single_match',
-    'LoggedCommand', 'CantMoveError'
+    'CantMoveError', 'compact_db'
 ]
 
 Base.metadata.create_all()
@@ -42,49 +47,86 @@ def get_classes():
     return classes
 
 
-def dump_object(obj):
-    """Return object obj as a dictionary."""
-    columns = inspect(obj.__class__).columns
-    d = {}
-    for name, column in columns.items():
-        value = getattr(obj, name)
-        if (
-            column.nullable is True and value is None
-        ) or (
-            column.default is not None and value == column.default.arg
-        ):
-            continue
-        d[name] = value
-    return d
-
-
 def dump_db(where=None):
-    """Dump the database to single files."""
+    """Dump the database to where (defaults to config.db_file) in the format
+    given by its extension."""
     if where is None:
         where = config.db_file
     logger.info('Dumping the database to %s.', where)
-    objects = []
-    for cls in get_classes():
-        objects.extend(Session.query(cls))
-    y = dumper_dump(objects, dump_object)
-    with open(where, 'w') as f:
-        dump(y, stream=f)
-    return len(objects)
+    return dump_world(where, get_classes(), journal.sequence)
+
+
+def compact_db():
+    """Dump the database and empty the journal, since everything in it is now
+    part of the dump. While the game is running, the journal is kept short by
+    background snapshots instead, so this is only done at shutdown."""
+    with session():
+        n = dump_db()
+    journal.truncate()
+    return n
+
+
+def snapshot_is_newest():
+    """Return True if the last background snapshot includes more of the
+    journal than the last dump. File times can't be trusted, since a snapshot
+    can finish after a later dump has emptied the journal."""
+    if not os.path.isfile(config.snapshot_file):
+        return False
+    elif not config.db_file or not os.path.isfile(config.db_file):
+        return True
+    return snapshots.read_sequence() > read_sequence(config.db_file)
+
+
+def create_indexes():
+    """Create any declared indexes which are missing from existing tables.
+    create_all only creates indexes along with their tables."""
+    for table in Base.metadata.tables.values():
+        for index in table.indexes:
+            ddl = str(CreateIndex(index).compile(bind=_engine))
+            _engine.execute(
+                ddl.replace('CREATE INDEX', 'CREATE INDEX IF NOT EXISTS', 1)
+            )
 
 
 def load_db():
-    """Load the database from a single flat file."""
-    logger.info('Creating database tables...')
-    Base.metadata.create_all()
-    if os.path.isfile(config.db_file):
-        logger.info('Loading the database from %s.', config.db_file)
-        with open(config.db_file, 'r') as f:
-            y = load(f)
-        with session() as s:
-            objects = dumper_load(y, get_classes())
-            s.add_all(objects)
+    """Load the database from a single flat file, or from the last snapshot if
+    it is newer. A persistent database is used as it is, and is only loaded
+    from config.db_file if it is empty."""
+    start = 0
+    if persistent:
+        logger.info('Creating database tables...')
+        Base.metadata.create_all()
+        create_indexes()
+        if any(cls.count() for cls in get_classes()):
+            logger.info('Using the existing database %s.', url.database)
+        elif config.db_file and os.path.isfile(config.db_file):
+            logger.info('Importing the database from %s.', config.db_file)
+            load_world(config.db_file, get_classes())
+        else:
+            logger.info('Starting with blank database.')
+    elif snapshot_is_newest():
+        logger.info('Restoring the database from %s.', config.snapshot_file)
+        start = snapshots.restore()
+        # Add any tables and indexes created since the snapshot was made.
+        Base.metadata.create_all()
+        create_indexes()
     else:
-        logger.info('Starting with blank database.')
+        logger.info('Creating database tables...')
+        Base.metadata.create_all()
+        if config.db_file and os.path.isfile(config.db_file):
+            logger.info('Loading the database from %s.', config.db_file)
+            start = load_world(config.db_file, get_classes())
+        else:
+            logger.info('Starting with blank database.')
+    if not persistent:
+        # Committed changes since the last dump are only in the journal.
+        with session() as s:
+            n = journal.replay(s.connection(), get_classes(), start=start)
+        if n:
+            logger.info('Replayed %d journal entries.', n)
+        journal.start()
+    # Rows loaded with Core statements did not trigger any mapper events.
+    cache.clear()
     finalise_db()
 
 
@@ -92,8 +134,11 @@ def finalise_db():
     """Bootstrap an empty database."""
     with session() as s:
         for cls in get_classes():
+            # Core counts are much quicker to compile than ORM ones.
             logger.info(
-                '%s: %d', cls.__table__.name.replace('_', ' '), cls.count()
+                '%s: %d', cls.__table__.name.replace('_', ' '), s.execute(
+                    select([func.count()]).select_from(cls.__table__)
+                ).scalar()
             )
         if not Direction.count():
             Direction.create(
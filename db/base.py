@@ -1,16 +1,31 @@
 """Provides base classes and mixins."""
 
-from passlib.hash import sha256_crypt as crypt
 from random_password import random_password
 from sqlalchemy import (
-    Column, Integer, String, ForeignKey, inspect, DateTime, func, Boolean
+    Column, Integer, String, ForeignKey, inspect, DateTime, func, Boolean,
+    event
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base, declared_attr
-from programming import lua
+from programming import lua, program_updated, program_deleted
 from .engine import engine
 from .session import Session
 
+password_rounds = 10000
+
+
+def encrypt_password(value):
+    """Return value hashed with the configured number of rounds."""
+    # passlib is slow to import, and isn't needed until someone logs in.
+    from passlib.hash import sha256_crypt as crypt
+    return crypt.encrypt(value, rounds=password_rounds)
+
+
+def verify_password(secret, hash):
+    """Return True if secret matches hash."""
+    from passlib.hash import sha256_crypt as crypt
+    return hash is not None and crypt.verify(secret, hash)
+
 
 class MatchError(Exception):
     """Match error."""
@@ -151,13 +166,11 @@ class PasswordMixin:
 
     def check_password(self, secret):
         """Check that secret matches self.password."""
-        return self.password is not None and crypt.verify(
-            secret, self.password
-        )
+        return verify_password(secret, self.password)
 
     def set_password(self, value):
         """Set self.password."""
-        self.password = crypt.encrypt(value, rounds=10000)
+        self.password = encrypt_password(value)
 
     def clear_password(self):
         """Effectively lock the account."""
@@ -228,3 +241,7 @@ class Message(String):
     def __init__(self, *args, **kwargs):
         kwargs.setdefault('length', 150)
         super().__init__(*args, **kwargs)
+
+
+event.listen(Base, 'after_update', program_updated, propagate=True)
+event.listen(Base, 'after_delete', program_deleted, propagate=True)
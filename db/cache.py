@@ -0,0 +1,165 @@
+"""Provides an in-memory cache of directions, exits, room commands and
+genders.
+
+Directions, exits and room commands are looked up on every movement or command,
+and genders every time a social uses a pronoun, but they hardly ever change.
+Directions are cached as DirectionInfo records keyed by both name and short
+name, exits are cached per room as a dictionary of names to ids, and room
+commands are cached per room as a Trie of names to ids, so they can be found by
+prefix. Genders are cached as GenderInfo records keyed by id. All are loaded
+the first time they are needed, and thrown away by mapper events whenever a row
+changes, or when a transaction is rolled back."""
+
+from attr import attrs, attrib
+from sqlalchemy import inspect
+from util import Trie
+from .base import Base
+from .session import Session
+
+# Maps names and short names to DirectionInfo instances, or None if not
+# loaded.
+directions = None
+
+# Maps direction names (but not short names) to DirectionInfo instances.
+direction_names = Trie()
+
+# Maps room ids to dictionaries of exit names to exit ids.
+exits = {}
+
+# Maps room ids to tries of room command names to room command ids.
+room_commands = {}
+
+# Maps gender ids to GenderInfo instances, or None for missing genders.
+genders = {}
+
+
+@attrs(frozen=True)
+class DirectionInfo:
+    """The parts of a direction needed for movement."""
+
+    id = attrib()
+    name = attrib()
+    short_name = attrib()
+    opposite_string = attrib()
+
+
+@attrs(frozen=True)
+class GenderInfo:
+    """The pronouns of a gender."""
+
+    id = attrib()
+    name = attrib()
+    subjective = attrib()
+    objective = attrib()
+    possessive_adjective = attrib()
+    possessive_noun = attrib()
+    reflexive = attrib()
+
+
+def load_directions():
+    """Load directions if they are not already cached."""
+    global directions, direction_names
+    if directions is None:
+        cls = Base._decl_class_registry['Direction']
+        directions = {}
+        for row in Session.query(
+            cls.id, cls.name, cls.short_name, cls.opposite_string
+        ):
+            info = DirectionInfo(*row)
+            # Names win over short names.
+            directions.setdefault(info.short_name, info)
+        direction_names = Trie()
+        for info in list(directions.values()):
+            directions[info.name] = info
+            direction_names.add(info.name, info)
+
+
+def get_direction(string):
+    """Return the DirectionInfo with string as its name or short name, or
+    None."""
+    load_directions()
+    return directions.get(string)
+
+
+def match_direction(prefix):
+    """Return the only DirectionInfo whose name starts with prefix, or
+    None."""
+    load_directions()
+    return direction_names.match(prefix)
+
+
+def get_exit_id(room_id, name):
+    """Return the id of the exit called name in the room with the given id, or
+    None."""
+    if room_id not in exits:
+        cls = Base._decl_class_registry['Exit']
+        d = {}
+        for exit_id, exit_name in Session.query(cls.id, cls.name).filter_by(
+            location_id=room_id
+        ).order_by(cls.id):
+            d.setdefault(exit_name, exit_id)  # The oldest exit wins.
+        exits[room_id] = d
+    return exits[room_id].get(name)
+
+
+def get_room_commands(room_id):
+    """Return a Trie mapping the names of the commands in the room with the
+    given id to their ids."""
+    if room_id not in room_commands:
+        cls = Base._decl_class_registry['RoomCommand']
+        room_commands[room_id] = Trie(
+            Session.query(cls.name, cls.id).filter_by(
+                location_id=room_id
+            ).order_by(cls.id)  # The oldest command wins.
+        )
+    return room_commands[room_id]
+
+
+def get_gender(id):
+    """Return the GenderInfo for the gender with the given id, or None."""
+    if id not in genders:
+        cls = Base._decl_class_registry['Gender']
+        row = Session.query(
+            cls.id, cls.name, cls.subjective, cls.objective,
+            cls.possessive_adjective, cls.possessive_noun, cls.reflexive
+        ).filter_by(id=id).first()
+        genders[id] = None if row is None else GenderInfo(*row)
+    return genders[id]
+
+
+def direction_changed(mapper, connection, target):
+    """A direction was added, changed or deleted."""
+    global directions
+    directions = None
+
+
+def exit_changed(mapper, connection, target):
+    """An exit was added, changed or deleted. Forget the exits of every room
+    it was, or is now, in."""
+    room_ids = set(inspect(target).attrs.location_id.history.sum())
+    room_ids.add(target.location_id)
+    for room_id in room_ids:
+        exits.pop(room_id, None)
+
+
+def room_command_changed(mapper, connection, target):
+    """A room command was added, changed or deleted. Forget the commands of
+    every room it was, or is now, in."""
+    room_ids = set(inspect(target).attrs.location_id.history.sum())
+    room_ids.add(target.location_id)
+    for room_id in room_ids:
+        room_commands.pop(room_id, None)
+
+
+def gender_changed(mapper, connection, target):
+    """A gender was added, changed or deleted."""
+    genders.clear()
+
+
+def clear(*args):
+    """Empty the cache."""
+    global directions
+    directions = None
+    exits.clear()
+    room_commands.clear()
+    genders.clear()
@@ -2,19 +2,86 @@
 
 from time import time
 from datetime import timedelta
-from sqlalchemy import Column, Boolean, String, Integer, ForeignKey, Float
+from sqlalchemy import (
+    Column, Boolean, Integer, ForeignKey, Float, Index, func
+)
 from sqlalchemy.orm import relationship
 from .base import (
     Base, NameDescriptionMixin, PasswordMixin, ExperienceMixin, LevelMixin,
     LocationMixin, StatisticsMixin, InvisibleMixin, Message
 )
-from .session import Session
-from socials import socials
+from .session import session
+from . import cache
+import command_log
+from config import config
+from game_clock import call_later
+from socials import get_strings
 from util import english_list, format_timedelta
-from programming import as_function
+from programming import call_program
 
 connections = {}
 
+# Maps room ids to dictionaries of character ids to connections, for the
+# characters who are logged in, so messages can be sent to everyone in a room
+# without loading the characters who aren't.
+occupants = {}
+
+# Maps the ids of logged in characters to the ids of the rooms they are
+# listed under in occupants.
+occupied = {}
+
+# Maps character ids to the Timers which will next regenerate their
+# statistics. Only characters with statistics below their maximums are here.
+regenerating = {}
+
+stat_names = ('hitpoints', 'mana', 'endurance')
+
+
+def add_occupant(character_id, room_id, connection):
+    """Record that the character with the given id is logged in, in the room
+    with the given id."""
+    remove_occupant(character_id)
+    occupants.setdefault(room_id, {})[character_id] = connection
+    occupied[character_id] = room_id
+
+
+def remove_occupant(character_id):
+    """Forget the character with the given id."""
+    room_id = occupied.pop(character_id, None)
+    room = occupants.get(room_id)
+    if room is not None:
+        room.pop(character_id, None)
+        if not room:
+            del occupants[room_id]
+
+
+def room_connections(room_id):
+    """Return a list of the connections of everyone logged in in the room
+    with the given id."""
+    return list(occupants.get(room_id, {}).values())
+
+
+def regenerate(character_id):
+    """Give the character with the given id back the regain of the room they
+    are in in each of their statistics which are below their maximums. Rooms
+    with no regain stop regeneration until the character moves or logs in
+    again."""
+    del regenerating[character_id]
+    with session():
+        character = Character.get(character_id)
+        if character is None:
+            return
+        location = character.location
+        regain = 0 if location is None else location.regain
+        if regain <= 0:
+            return
+        for name in stat_names:
+            if getattr(character, name) is not None:
+                # Setting the statistic starts the next regeneration if it is
+                # still below its maximum.
+                prop = getattr(Character, name[0])
+                prop.set(character, prop.get(character) + regain)
+
 
 class CantMoveError(Exception):
     """A character cannot move for some reason."""
@@ -44,6 +111,8 @@ class StatProperty(property):
         if value >= self.get_max_value(instance):
             value = None
         setattr(instance, self.name, value)
+        if value is not None:
+            instance.start_regenerating()
 
 
 class Race(Base, NameDescriptionMixin, LocationMixin):
@@ -59,6 +128,12 @@ class Character(
     """A player instance."""
 
     __tablename__ = 'characters'
+    __table_args__ = (
+        # Used to find the characters in a room.
+        Index('ix_characters_location_id', 'location_id'),
+        # Used to find connected admins for every log record.
+        Index('ix_characters_connected_admin', 'connected', 'admin'),
+    )
     resting = Column(Boolean, nullable=False, default=False)
     log_commands = Column(Boolean, nullable=False, default=False)
     walk_style = Column(Message, nullable=False, default='walk%1s')
@@ -101,16 +176,31 @@ class Character(
             duration = timedelta(seconds=self.can_move_time - now)
             raise CantMoveError(f'Wait {format_timedelta(duration)}.')
 
+    def start_regenerating(self):
+        """Make sure this character's statistics will be regenerated every
+        config.regain_interval seconds until they reach their maximums."""
+        if self.id is not None and self.id not in regenerating and any(
+            getattr(self, name) is not None for name in stat_names
+        ):
+            regenerating[self.id] = call_later(
+                config.regain_interval, regenerate, self.id
+            )
+
     def move(self, where):
         """Used to move a character, calls appropriate events on old and new
         rooms."""
         if self.location is not None and self.location.on_exit is not None:
-            as_function(
-                self.location.on_exit, character=self, this=self.location
+            call_program(
+                self.location, 'on_exit', character=self, this=self.location
             )
         if where.on_enter is not None:
-            as_function(where.on_enter, character=self, this=where)
+            call_program(where, 'on_enter', character=self, this=where)
         self.location = where
+        connection = connections.get(self.id)
+        if connection is not None:
+            add_occupant(self.id, where.id, connection)
+        # Regeneration stops in rooms with no regain.
+        self.start_regenerating()
 
     @property
     def connection(self):
@@ -122,6 +212,10 @@ class Character(
         if connection is None:
             if self.connection is not None:
                 del connections[self.id]
+                remove_occupant(self.id)
+                timer = regenerating.pop(self.id, None)
+                if timer is not None:
+                    timer.cancel()
             return
         if self.connection is not None:
             connection.notify('*** Booting old connection. ***')
@@ -129,16 +223,19 @@ class Character(
                 '*** Logging you in from somewhere else ***'
             )
             self.connection.object = None
-            self.connection.transport.loseConnection()
+            self.connection.disconnect()
         connections[self.id] = connection
+        add_occupant(self.id, self.location_id, connection)
+        self.start_regenerating()
         self.notify(f'Welcome, {self.name}.')
 
     def get_gender(self):
+        """Return the GenderInfo for this character's gender."""
         if self.gender_id is None:
             gid = 1
         else:
             gid = self.gender_id
-        return Base._decl_class_registry['Gender'].get(gid)
+        return cache.get_gender(gid)
 
     def notify(self, string):
         """Send a string of text to this character."""
@@ -171,13 +268,14 @@ class Character(
         perspectives = [self]
         if _others is not None:
             perspectives.extend(_others)
-        strings = socials.get_strings(string, perspectives, **kwargs)
-        for obj in self.get_visible():
-            if obj in perspectives:
-                msg = strings[perspectives.index(obj)]
-            else:
-                msg = strings[-1]
-            obj.notify(msg)
+        strings = get_strings(string, perspectives, **kwargs)
+        indices = {}
+        for index, obj in enumerate(perspectives):
+            if isinstance(obj, Character):
+                indices.setdefault(obj.id, index)
+        for con in room_connections(self.location.id):
+            if not con.character.invisible:
+                con.notify(strings[indices.get(con.object_id, -1)])
 
     def get_visible(self):
         """Get the things this player can see."""
@@ -243,17 +341,11 @@ class Character(
 
     def log_command(self, command):
         """Log a command entered by this character."""
-        Session.add(LoggedCommand(command=command, character_id=self.id))
+        command_log.log(self.id, self.name, command)
 
 
-for name in ('hitpoints', 'mana', 'endurance'):
+for name in stat_names:
     setattr(Character, name[0], StatProperty(name))
 
-
-class LoggedCommand(Base):
-    """A command typed by a character."""
-
-    __tablename__ = 'logged_commands'
-    command = Column(String(10000), nullable=False)
-    character_id = Column(Integer, ForeignKey('characters.id'), nullable=True)
-    character = relationship('Character', backref='logged_commands')
+# Character names are matched case-insensitively when logging in.
+Index('ix_characters_name_lower', func.lower(Character.name))
@@ -0,0 +1,281 @@
+"""Provides the file formats the world can be stored in.
+
+The format is chosen by the extension of the filename:
+
+* .yaml or .yml: Human-readable YAML, loaded with bulk inserts.
+* .sqlite or .db: A copy of the database itself. Dumping uses the SQLite backup
+  API, and loading copies each table with a single INSERT ... SELECT. When the
+  game runs on another database, rows are copied in batches instead.
+
+Every loader returns the journal sequence number stored in the file, and every
+dumper is given the sequence number to store."""
+
+import logging
+import os
+import sqlite3
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.schema import sort_tables_and_constraints
+from db_dumper import dump as dumper_dump
+from yaml import load, dump
+try:
+    from yaml import CLoader as Loader, CDumper as Dumper
+except ImportError:  # PyYAML was built without libyaml.
+    from yaml import Loader, Dumper
+from .base import Base
+from .engine import engine
+from .session import Session
+
+logger = logging.getLogger(__name__)
+
+# The number of rows to insert at a time when loading YAML.
+batch_size = 1000
+
+# The key used to store the journal sequence number in YAML files.
+sequence_key = '__journal__'
+
+
+def dump_object(obj):
+    """Return object obj as a dictionary."""
+    columns = inspect(obj.__class__).columns
+    d = {}
+    for name, column in columns.items():
+        value = getattr(obj, name)
+        if (
+            column.nullable is True and value is None
+        ) or (
+            column.default is not None and value == column.default.arg
+        ):
+            continue
+        d[name] = value
+    return d
+
+
+def column_default(column):
+    """Return the python-side default for column, or None."""
+    default = column.default
+    if default is not None and default.is_scalar:
+        return default.arg
+
+
+def insert_order():
+    """Return all tables, sorted so that tables come after the tables they
+    have foreign keys to, wherever that is possible."""
+    return [
+        table for table, constraints in sort_tables_and_constraints(
+            Base.metadata.tables.values()
+        ) if table is not None
+    ]
+
+
+def reset_sequences(con):
+    """Move primary key sequences past the ids which were inserted
+    explicitly. SQLite works this out for itself."""
+    if con.dialect.name != 'postgresql':
+        return
+    for table in Base.metadata.tables.values():
+        con.execute(
+            text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), "
+                f'COALESCE(MAX(id), 0) + 1, false) FROM "{table.name}"'
+            )
+        )
+
+
+def copy_tables(source, target):
+    """Copy rows from every table in the source connection to the same table
+    in the target connection, in batches. Only columns present in both are
+    copied."""
+    source_tables = set(inspect(source).get_table_names())
+    for table in insert_order():
+        if table.name not in source_tables:
+            continue  # A new table.
+        found = {c['name'] for c in inspect(source).get_columns(table.name)}
+        columns = [c for c in table.columns if c.name in found]
+        result = source.execute(select(columns))
+        while True:
+            rows = result.fetchmany(batch_size)
+            if not rows:
+                break
+            target.execute(table.insert(), [dict(row) for row in rows])
+
+
+def load_yaml(filename, classes):
+    """Load YAML from filename. Rows are inserted one table at a time with
+    bulk Core inserts, so no ORM objects are created until they are
+    queried."""
+    with open(filename, 'r') as f:
+        y = load(f, Loader=Loader)
+    sequence = y.pop(sequence_key, 0)
+    names = {cls.__table__: cls.__name__ for cls in classes}
+    with engine.begin() as con:
+        for table in insert_order():
+            rows = y.get(names.get(table), None)
+            if not rows:
+                continue
+            # Dumps leave out columns which are null or have their default
+            # value, but every row in an executemany must have the same keys.
+            keys = set().union(*rows)
+            defaults = {
+                c.name: column_default(c) for c in table.columns
+                if c.name in keys
+            }
+            for start in range(0, len(rows), batch_size):
+                con.execute(
+                    table.insert(), [
+                        dict(defaults, **row)
+                        for row in rows[start:start + batch_size]
+                    ]
+                )
+        reset_sequences(con)
+    return sequence
+
+
+def dump_yaml(filename, classes, sequence):
+    """Dump all objects of classes to filename as YAML."""
+    objects = []
+    for cls in classes:
+        objects.extend(Session.query(cls))
+    y = dumper_dump(objects, dump_object)
+    with open(filename, 'w') as f:
+        # The sequence number goes first, so read_sequence can find it
+        # without loading the whole file.
+        dump({sequence_key: sequence}, stream=f, Dumper=Dumper)
+        if y:
+            dump(y, stream=f, Dumper=Dumper)
+    return len(objects)
+
+
+def load_sqlite(filename, classes):
+    """Copy every table found in the SQLite database filename. The file is
+    attached to the running database, so rows are copied by SQLite itself
+    without passing through Python. Only columns present in both the file and
+    the current schema are copied, so files written before columns were added
+    still load."""
+    if engine.dialect.name != 'sqlite':
+        source = create_engine(f'sqlite:///{filename}')
+        try:
+            with source.connect() as src, engine.begin() as con:
+                copy_tables(src, con)
+                reset_sequences(con)
+                return src.execute('PRAGMA user_version').scalar()
+        finally:
+            source.dispose()
+    fairy = engine.raw_connection()
+    try:
+        target = fairy.connection
+        target.commit()  # Cannot attach inside a transaction.
+        target.execute('ATTACH DATABASE ? AS world', (filename,))
+        try:
+            for table in Base.metadata.tables.values():
+                found = {
+                    row[1] for row in target.execute(
+                        f'PRAGMA world.table_info("{table.name}")'
+                    )
+                }
+                if not found:
+                    continue  # A new table.
+                columns = ', '.join(
+                    f'"{c.name}"' for c in table.columns if c.name in found
+                )
+                target.execute(
+                    f'INSERT INTO main."{table.name}" ({columns}) '
+                    f'SELECT {columns} FROM world."{table.name}"'
+                )
+            target.commit()
+            return target.execute(
+                'PRAGMA world.user_version'
+            ).fetchone()[0]
+        finally:
+            target.execute('DETACH DATABASE world')
+    finally:
+        fairy.close()
+
+
+def dump_sqlite(filename, classes, sequence):
+    """Copy the whole database to filename."""
+    if os.path.isfile(filename):
+        os.remove(filename)
+    if engine.dialect.name != 'sqlite':
+        target = create_engine(f'sqlite:///{filename}')
+        try:
+            Base.metadata.create_all(target)
+            with engine.connect() as con, target.begin() as dest:
+                copy_tables(con, dest)
+                dest.execute(f'PRAGMA user_version = {int(sequence)}')
+                return sum(
+                    dest.execute(
+                        f'SELECT COUNT(*) FROM "{cls.__table__.name}"'
+                    ).scalar() for cls in classes
+                )
+        finally:
+            target.dispose()
+    target = sqlite3.connect(filename)
+    fairy = engine.raw_connection()
+    try:
+        fairy.connection.backup(target)
+        target.execute(f'PRAGMA user_version = {int(sequence)}')
+        target.commit()
+        return sum(
+            target.execute(
+                f'SELECT COUNT(*) FROM "{cls.__table__.name}"'
+            ).fetchone()[0] for cls in classes
+        )
+    finally:
+        fairy.close()
+        target.close()
+
+
+formats = {
+    '.yaml': (load_yaml, dump_yaml),
+    '.yml': (load_yaml, dump_yaml),
+    '.sqlite': (load_sqlite, dump_sqlite),
+    '.db': (load_sqlite, dump_sqlite)
+}
+
+
+def get_format(filename):
+    """Return (loader, dumper) for filename. Raise ValueError if the extension
+    is not recognised."""
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in formats:
+        raise ValueError(f'Unknown world format: {filename}.')
+    return formats[ext]
+
+
+def read_sequence(filename):
+    """Return the journal sequence number stored in filename, without loading
+    the rest of it."""
+    loader, dumper = get_format(filename)
+    if loader is load_sqlite:
+        con = sqlite3.connect(filename)
+        try:
+            return con.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            con.close()
+    with open(filename, 'r') as f:
+        name, _, value = f.readline().partition(':')
+        if name == sequence_key:
+            return int(value)
+        # Written before the sequence number came first.
+        f.seek(0)
+        y = load(f, Loader=Loader)
+    return y.get(sequence_key, 0) if isinstance(y, dict) else 0
+
+
+def load_world(filename, classes):
+    """Load filename in the appropriate format, returning its journal
+    sequence number."""
+    loader, dumper = get_format(filename)
+    return loader(filename, classes)
+
+
+def dump_world(filename, classes, sequence):
+    """Dump the database to filename in the appropriate format, returning the
+    number of rows dumped. The file is written under a temporary name first
+    so a crash cannot leave us with half a world."""
+    loader, dumper = get_format(filename)
+    base, ext = os.path.splitext(filename)
+    tmp = f'{base}.tmp{ext}'
+    n = dumper(tmp, classes, sequence)
+    os.replace(tmp, filename)
+    return n
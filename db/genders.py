@@ -1,7 +1,8 @@
 """Provides the Gender class."""
 
-from sqlalchemy import Column, String
+from sqlalchemy import Column, String, event
 from .base import Base, NameMixin
+from . import cache
 
 
 class Gender(Base, NameMixin):
@@ -22,3 +23,7 @@ class Gender(Base, NameMixin):
     possessive_adjective = Column(String(15), nullable=False, default='its')
     possessive_noun = Column(String(15), nullable=False, default='its')
     reflexive = Column(String(15), nullable=False, default='itself')
+
+
+for name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Gender, name, cache.gender_changed)
@@ -1,6 +1,6 @@
 """Provides the Guild class."""
 
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from .base import Base, NameDescriptionMixin, LevelMixin
 
@@ -9,6 +9,9 @@ class GuildSecondary(Base, LevelMixin):
     """Link characters to classes."""
 
     __tablename__ = 'guild_secondary'
+    __table_args__ = (
+        Index('ix_guild_secondary_character_id', 'character_id', 'guild_id'),
+    )
     character_id = Column(Integer, ForeignKey('characters.id'), nullable=False)
     guild_id = Column(
         Integer, ForeignKey('guilds.id'), nullable=False
@@ -0,0 +1,203 @@
+"""Provides an append-only journal of database changes.
+
+Every committed insert, update and delete made through the ORM is appended to
+config.journal_file as a single line of JSON. Each entry carries a sequence
+number. Background snapshots, and the dump written by compact_db at shutdown,
+record the last sequence number they include, so load_db can restore the world
+from whichever is newest plus the tail of the journal. Once a snapshot has
+been written, the entries it includes are dropped, so the journal grows with
+the changes made since then rather than with the size of the world.
+
+Rows changed through Core statements or many-to-many relationship collections
+bypass the ORM flush and are only persisted by the next snapshot."""
+
+import json
+import logging
+import os
+import shutil
+from datetime import datetime
+from sqlalchemy import event, inspect, DateTime
+from config import config
+from .session import session_factory
+
+logger = logging.getLogger(__name__)
+
+# The open journal file, or None if journalling is disabled.
+stream = None
+
+# The sequence number of the last entry written.
+sequence = 0
+
+# Counts the times the journal has been cut back, so a snapshot can tell
+# whether the offset it recorded still points at the same entry.
+truncations = 0
+
+
+def encode_value(value):
+    """Make value safe for JSON."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def decode_row(table, data):
+    """Convert JSON values in data back into python values for table."""
+    for name, value in data.items():
+        if value is not None and isinstance(table.c[name].type, DateTime):
+            data[name] = datetime.fromisoformat(value)
+    return data
+
+
+def row_changes(obj, insert=False):
+    """Return a dictionary of column values for obj. If insert is False only
+    changed columns are included."""
+    state = inspect(obj)
+    d = {}
+    for prop in state.mapper.column_attrs:
+        name = prop.key
+        if insert or state.attrs[name].history.has_changes():
+            d[name] = encode_value(getattr(obj, name))
+    return d
+
+
+def after_flush(session, flush_context):
+    """Gather the changes made by this flush."""
+    if stream is None:
+        return
+    entries = session.info.setdefault('journal', [])
+    for op, objects in (
+        ('insert', session.new),
+        ('update', session.dirty),
+        ('delete', session.deleted)
+    ):
+        for obj in objects:
+            if op == 'delete':
+                data = None
+            else:
+                data = row_changes(obj, insert=op == 'insert')
+                if not data:
+                    continue  # Only relationships have changed.
+            entries.append([op, obj.__class__.__name__, obj.id, data])
+
+
+def after_commit(session):
+    """Write the changes for this transaction to the journal."""
+    entries = session.info.pop('journal', None)
+    if entries:
+        write(entries)
+
+
+def after_rollback(session, previous_transaction):
+    """Throw away any changes which will not be committed."""
+    session.info.pop('journal', None)
+
+
+event.listen(session_factory, 'after_flush', after_flush)
+event.listen(session_factory, 'after_commit', after_commit)
+event.listen(session_factory, 'after_soft_rollback', after_rollback)
+
+
+def write(entries):
+    """Append entries to the journal."""
+    global sequence
+    lines = []
+    for op, class_name, id, data in entries:
+        sequence += 1
+        lines.append(
+            json.dumps(
+                dict(seq=sequence, op=op, cls=class_name, id=id, data=data)
+            )
+        )
+    stream.write('\n'.join(lines) + '\n')
+    stream.flush()
+    if config.journal_sync:
+        os.fsync(stream.fileno())
+
+
+def replay(connection, classes, start=0):
+    """Apply every entry after sequence number start to the database through
+    connection. Returns the number of entries applied."""
+    global sequence
+    sequence = start
+    path = config.journal_file
+    if not os.path.isfile(path):
+        return 0
+    tables = {cls.__name__: cls.__table__ for cls in classes}
+    applied = 0
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Probably a partial line written as we crashed.
+                logger.warning('Ignoring corrupt journal entry: %r.', line)
+                continue
+            if entry['seq'] <= start:
+                continue
+            table = tables.get(entry['cls'])
+            if table is None:
+                # A class which has since been removed, such as LoggedCommand.
+                continue
+            if entry['op'] == 'delete':
+                stmt = table.delete().where(table.c.id == entry['id'])
+            else:
+                data = decode_row(table, entry['data'])
+                if entry['op'] == 'insert':
+                    stmt = table.insert().values(**data)
+                else:
+                    stmt = table.update().where(
+                        table.c.id == entry['id']
+                    ).values(**data)
+            connection.execute(stmt)
+            sequence = entry['seq']
+            applied += 1
+    return applied
+
+
+def start():
+    """Start journalling changes."""
+    global stream
+    if stream is None:
+        logger.info('Journalling changes to %s.', config.journal_file)
+        stream = open(config.journal_file, 'a')
+
+
+def stop():
+    """Stop journalling changes."""
+    global stream
+    if stream is not None:
+        stream.close()
+        stream = None
+
+
+def offset():
+    """Return the size of the journal written so far, or None if journalling
+    is disabled."""
+    if stream is not None:
+        return stream.tell()
+
+
+def truncate(start=0):
+    """Drop the entries before the offset start, or every entry if it is 0,
+    as they have been snapshotted. The rest are copied to a new file, which
+    then replaces the journal."""
+    global stream, truncations
+    if stream is None:
+        return
+    truncations += 1
+    if not start:
+        stream.seek(0)
+        stream.truncate()
+        stream.flush()
+        return
+    path = stream.name
+    tmp = f'{path}.tmp'
+    with open(path, 'r') as f, open(tmp, 'w') as g:
+        f.seek(start)
+        shutil.copyfileobj(f, g)
+        g.flush()
+        if config.journal_sync:
+            os.fsync(g.fileno())
+    os.replace(tmp, path)
+    stream.close()
+    stream = open(path, 'a')
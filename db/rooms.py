@@ -1,13 +1,17 @@
 """Provides room-related classes."""
 
 import logging
-from sqlalchemy import Column, Boolean, Integer, ForeignKey, String, or_
+from sqlalchemy import (
+    Column, Boolean, Integer, ForeignKey, String, Index, event
+)
 from sqlalchemy.orm import relationship
 from .base import (
     Base, NameMixin, NameDescriptionMixin, LocationMixin, CoordinatesMixin,
     Code, CodeMixin, Message
 )
-from .session import Session
+from .session import Session, session_factory
+from .characters import room_connections
+from . import cache
 
 logger = logging.getLogger(__name__)
 
@@ -64,6 +68,7 @@ class Room(Base, NameDescriptionMixin, CoordinatesMixin):
     """A room instance."""
 
     __tablename__ = 'rooms'
+    __table_args__ = (Index('ix_rooms_coordinates', 'x', 'y', 'z'),)
     lit = Column(Boolean, nullable=False, default=True)
     safe = Column(Boolean, nullable=False, default=False)
     regain = Column(Integer, nullable=False, default=1)
@@ -76,31 +81,37 @@ class Room(Base, NameDescriptionMixin, CoordinatesMixin):
     def contents(self):
         return self.objects + self.characters
 
-    def broadcast(self, message):
-        """Send a message to everyone in this room."""
-        for c in self.characters:
-            c.notify(message)
+    def broadcast(self, message, exclude=None):
+        """Send a message to everyone logged in in this room, except the
+        character exclude."""
+        for con in room_connections(self.id):
+            if exclude is None or con.object_id != exclude.id:
+                con.notify(message)
 
     def match_direction(self, string):
         """Return a single direction or None."""
-        return Direction.query(
-            or_(Direction.name == string, Direction.short_name == string)
-        ).first()
+        d = cache.get_direction(string)
+        if d is not None:
+            return Direction.get(d.id)
 
     def match_exit(self, name):
         """Try to find an exit in the current room with the given name."""
-        x = Exit.query(location_id=self.id, name=name).first()
-        if x is None:
-            d = self.match_direction(name)
+        exit_id = cache.get_exit_id(self.id, name)
+        if exit_id is None:
+            d = cache.get_direction(name)
             if d is not None:
-                return Exit.query(location_id=self.id, name=d.name).first()
-        return x
+                exit_id = cache.get_exit_id(self.id, d.name)
+        if exit_id is not None:
+            return Exit.get(exit_id)
 
 
 class Exit(Base, NameDescriptionMixin, LocationMixin):
     """Link rooms together."""
 
     __tablename__ = 'exits'
+    __table_args__ = (
+        Index('ix_exits_location_id_name', 'location_id', 'name'),
+    )
     target_id = Column(Integer, ForeignKey('rooms.id'), nullable=True)
     target = relationship(
         'Room', backref='entrances', foreign_keys=[target_id]
@@ -118,3 +129,13 @@ class RoomCommand(Base, NameDescriptionMixin, LocationMixin, CodeMixin):
     """Add commands to rooms."""
 
     __tablename__ = 'room_commands'
+    __table_args__ = (
+        Index('ix_room_commands_location_id_name', 'location_id', 'name'),
+    )
+
+
+for name in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Direction, name, cache.direction_changed)
+    event.listen(Exit, name, cache.exit_changed)
+    event.listen(RoomCommand, name, cache.room_command_changed)
+event.listen(session_factory, 'after_soft_rollback', cache.clear)
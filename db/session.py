@@ -1,11 +1,30 @@
-"""Provides the scoped session."""
+"""Provides the scoped session.
+
+Sessions are normally scoped to the current thread, and closed by the session
+context manager. Connections get their own long-lived session with
+bound_session instead, so the objects they use stay in its identity map from
+one line to the next. After any session commits, the objects it changed (and
+the objects they refer to through foreign keys) are expired or expunged in
+every other session, so bound sessions never see stale rows."""
 
 from contextlib import contextmanager
+from threading import get_ident, local
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.orm.util import identity_key
 from .engine import engine
 
+scope = local()
+
+
+def get_scope():
+    """Return the owner of the current bound session, or the current thread
+    if there isn't one."""
+    return getattr(scope, 'owner', None) or get_ident()
+
+
 session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory)
+Session = scoped_session(session_factory, scopefunc=get_scope)
 
 
 @contextmanager
@@ -20,3 +39,101 @@ def session():
         raise e
     finally:
         Session.remove()
+
+
+@contextmanager
+def bound_session(owner):
+    """Use the session belonging to owner for the lifetime of this context,
+    committing it at the end but leaving it open."""
+    previous = getattr(scope, 'owner', None)
+    scope.owner = owner
+    try:
+        if not Session.registry.has():
+            # Objects should not be reloaded after every command.
+            Session.registry.set(session_factory(expire_on_commit=False))
+        s = Session()
+        try:
+            yield s
+            s.commit()
+        except Exception as e:
+            s.rollback()
+            raise e
+    finally:
+        scope.owner = previous
+
+
+def remove_session(owner):
+    """Close the session belonging to owner."""
+    s = Session.registry.registry.pop(owner, None)
+    if s is not None:
+        s.close()
+
+
+# Maps tables to their mapped classes.
+table_classes = {}
+
+
+def get_class(table):
+    """Return the mapped class for table, or None."""
+    if not table_classes:
+        from .base import Base
+        for cls in Base._decl_class_registry.values():
+            if hasattr(cls, '__table__'):
+                table_classes[cls.__table__] = cls
+    return table_classes.get(table)
+
+
+def changed_keys(obj):
+    """Return the identity keys of obj and every row it refers to (or used to
+    refer to) with a foreign key, since their relationship collections may
+    have changed too."""
+    state = inspect(obj)
+    keys = {state.key}
+    for column in state.mapper.local_table.columns:
+        if not column.foreign_keys:
+            continue
+        prop = state.mapper.get_property_by_column(column)
+        values = set(state.attrs[prop.key].history.sum())
+        values.add(getattr(obj, prop.key))
+        values.discard(None)
+        for fk in column.foreign_keys:
+            cls = get_class(fk.column.table)
+            if cls is not None:
+                keys.update(identity_key(cls, value) for value in values)
+    return keys
+
+
+def after_flush(s, flush_context):
+    """Remember what this flush changed."""
+    changed, deleted = s.info.setdefault('changed', (set(), set()))
+    for obj in s.new | s.dirty | s.deleted:
+        changed.update(changed_keys(obj))
+    deleted.update(inspect(obj).key for obj in s.deleted)
+
+
+def after_commit(s):
+    """Tell every other session about the committed changes."""
+    changed, deleted = s.info.pop('changed', (None, None))
+    if not changed:
+        return
+    for other in list(Session.registry.registry.values()):
+        if other is s:
+            continue
+        for key in changed:
+            obj = other.identity_map.get(key)
+            if obj is None:
+                continue
+            elif key in deleted:
+                other.expunge(obj)
+            else:
+                other.expire(obj)
+
+
+def after_rollback(s, previous_transaction):
+    """Forget changes which were never committed."""
+    s.info.pop('changed', None)
+
+
+event.listen(session_factory, 'after_flush', after_flush)
+event.listen(session_factory, 'after_commit', after_commit)
+event.listen(session_factory, 'after_soft_rollback', after_rollback)
@@ -1,6 +1,6 @@
 """Provides skil-related classes."""
 
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index
 from sqlalchemy.ext.declarative import declared_attr
 from sqlalchemy.orm import relationship
 from .base import Base, NameDescriptionMixin, LevelMixin, Message, Code
@@ -36,6 +36,15 @@ class ActiveSkillMixin(SkillMixin):
 class SkillSecondaryMixin(LevelMixin):
     """Link skills to players."""
 
+    @declared_attr
+    def __table_args__(cls):
+        return (
+            Index(
+                f'ix_{cls.__tablename__}_character_id', 'character_id',
+                'skill_id'
+            ),
+        )
+
     @declared_attr
     def character_id(cls):
         return Column(Integer, ForeignKey('characters.id'), nullable=False)
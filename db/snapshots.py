@@ -0,0 +1,207 @@
+"""Provides background snapshots of the running database.
+
+Snapshots are made with the SQLite online backup API. The backup runs in a
+worker thread a few pages at a time, and the reactor is parked for the
+duration of each step so that every page is copied between reactor events,
+never half way through a transaction. The copy is made into memory, then
+written to config.snapshot_file, again in the worker thread.
+
+The journal sequence number of the snapshot is stored in the user_version
+pragma of the snapshot file, so restoring a snapshot and replaying the journal
+tail gives the latest committed state. Once a snapshot has been written, the
+entries it includes are dropped from the journal, so the journal only grows
+with the changes made since the last snapshot."""
+
+import logging
+import os
+import sqlite3
+from threading import Event
+from time import monotonic
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread
+from config import config
+from .engine import engine
+from . import journal
+
+logger = logging.getLogger(__name__)
+
+# How long the worker will wait for the reactor to park before giving up.
+park_timeout = 5.0
+
+# How long the reactor will stay parked while the worker copies a step of
+# pages. If the worker takes any longer, the snapshot is abandoned.
+step_timeout = 0.5
+
+
+class SnapshotError(Exception):
+    """A snapshot could not be made."""
+
+
+class Snapshot:
+    """A single snapshot in progress."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parked = Event()
+        self.resume = Event()
+        self.sequence = None
+        # Where the journal ended when the last page was copied.
+        self.journal_offset = None
+        self.truncations = None
+        self.steps = 0
+        self.longest_step = 0.0
+        self.step_started = None
+        self.abandoned = False
+
+    def park(self):
+        """Called on the reactor thread. Wait for the worker to copy a step of
+        pages."""
+        self.parked.set()
+        if not self.resume.wait(step_timeout):
+            # Pages copied from now on might be half way through a
+            # transaction.
+            self.abandoned = True
+        self.resume.clear()
+
+    def request_park(self):
+        """Called on the worker thread. Wait for the reactor to park."""
+        self.parked.clear()
+        reactor.callFromThread(self.park)
+        if not self.parked.wait(park_timeout):
+            raise SnapshotError('The reactor did not park in time.')
+        self.step_started = monotonic()
+
+    def release(self):
+        """Let the reactor continue."""
+        self.longest_step = max(
+            self.longest_step, monotonic() - self.step_started
+        )
+        self.resume.set()
+
+    def progress(self, status, remaining, total):
+        """Called by the backup API after each step."""
+        if self.abandoned:
+            raise SnapshotError('The reactor stopped waiting for a step.')
+        self.steps += 1
+        if not remaining:
+            # The reactor is still parked, so nothing can have been committed
+            # since the last page was copied.
+            self.sequence = journal.sequence
+            self.journal_offset = journal.offset()
+            self.truncations = journal.truncations
+        self.release()
+        if remaining:
+            self.request_park()
+
+    def run(self, source):
+        """Called on the worker thread. Copy source into memory, then write it
+        to self.path. Returns the number of bytes written."""
+        copy = sqlite3.connect(':memory:', check_same_thread=False)
+        try:
+            self.request_park()
+            try:
+                source.backup(
+                    copy, pages=config.snapshot_pages, progress=self.progress
+                )
+            finally:
+                self.resume.set()
+            copy.execute(f'PRAGMA user_version = {int(self.sequence)}')
+            tmp = f'{self.path}.tmp'
+            if os.path.isfile(tmp):
+                os.remove(tmp)
+            target = sqlite3.connect(tmp)
+            try:
+                copy.backup(target)
+            finally:
+                target.close()
+            os.replace(tmp, self.path)
+            return os.path.getsize(self.path)
+        finally:
+            copy.close()
+
+    def compact(self):
+        """Called on the reactor thread once the snapshot has been written.
+        Drop the journal entries it includes."""
+        if self.journal_offset and self.truncations == journal.truncations:
+            journal.truncate(self.journal_offset)
+
+
+# The snapshot currently in progress.
+current = None
+
+
+def snapshot(path=None):
+    """Start a snapshot to path, defaulting to config.snapshot_file. Returns a
+    Deferred which fires with the Snapshot instance."""
+    global current
+    if path is None:
+        path = config.snapshot_file
+    if current is not None:
+        logger.warning('Not snapshotting: a snapshot is already running.')
+        return
+    current = Snapshot(path)
+    started = monotonic()
+    fairy = engine.raw_connection()
+
+    def done(size):
+        if path == config.snapshot_file:
+            # Only this snapshot is restored by load_db.
+            current.compact()
+        logger.info(
+            'Snapshot of sequence %d written to %s: %d bytes in %.2f '
+            'seconds (%d steps, longest %.1f ms).', current.sequence, path,
+            size, monotonic() - started, current.steps,
+            current.longest_step * 1000
+        )
+        return current
+
+    def failed(failure):
+        logger.warning('Snapshot failed:')
+        logger.error(failure.getTraceback())
+
+    def finished(result):
+        global current
+        fairy.close()
+        current = None
+        return result
+
+    d = deferToThread(current.run, fairy.connection)
+    d.addCallbacks(done, failed)
+    d.addBoth(finished)
+    return d
+
+
+def read_sequence(path=None):
+    """Return the journal sequence number of the snapshot at path, which
+    defaults to config.snapshot_file."""
+    if path is None:
+        path = config.snapshot_file
+    con = sqlite3.connect(path)
+    try:
+        return con.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        con.close()
+
+
+def restore(path=None):
+    """Copy the snapshot at path into the database, returning its journal
+    sequence number."""
+    if path is None:
+        path = config.snapshot_file
+    source = sqlite3.connect(path)
+    fairy = engine.raw_connection()
+    try:
+        sequence = source.execute('PRAGMA user_version').fetchone()[0]
+        source.backup(fairy.connection)
+        return sequence
+    finally:
+        fairy.close()
+        source.close()
+
+
+def start():
+    """Start taking snapshots every config.snapshot_interval seconds."""
+    task = LoopingCall(snapshot)
+    task.start(config.snapshot_interval, now=False)
+    return task
@@ -0,0 +1,66 @@
+"""Provides a thread pool for running database work off the reactor thread.
+
+When the database lives outside the process (a file, or a server such as
+PostgreSQL), slow queries can run in worker threads, each with a session of
+its own, so they don't freeze every other client. An in-memory database only
+exists on the connection which created it, so work is run straight away on
+the reactor thread instead.
+
+Functions run this way should only read from the database, and should return
+plain values (ids, strings, tuples) rather than mapped objects, since their
+session is closed as soon as they return."""
+
+import logging
+from twisted.internet import reactor
+from twisted.internet.defer import maybeDeferred
+from twisted.internet.threads import deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+from config import config
+from .engine import persistent
+from .session import scope, session
+
+__all__ = ['run']
+logger = logging.getLogger(__name__)
+
+pool = None
+
+
+def get_pool():
+    """Return the database thread pool, starting it if necessary."""
+    global pool
+    if pool is None:
+        threads = max(1, config.db_threads)
+        logger.info('Starting database pool with %d threads.', threads)
+        pool = ThreadPool(minthreads=0, maxthreads=threads, name=__name__)
+        pool.start()
+        reactor.addSystemEventTrigger('during', 'shutdown', stop_pool)
+    return pool
+
+
+def stop_pool():
+    """Stop the database thread pool."""
+    global pool
+    if pool is not None:
+        logger.info('Stopping database pool.')
+        pool.stop()
+        pool = None
+
+
+def call(func, *args):
+    """Call func with args in a session of its own, rather than in any bound
+    session which happens to be in use."""
+    previous = getattr(scope, 'owner', None)
+    scope.owner = None
+    try:
+        with session():
+            return func(*args)
+    finally:
+        scope.owner = previous
+
+
+def run(func, *args):
+    """Run func with args in a worker thread if the database allows it,
+    returning a Deferred which fires with the result."""
+    if not persistent:
+        return maybeDeferred(call, func, *args)
+    return deferToThreadPool(reactor, get_pool(), call, func, *args)
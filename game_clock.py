@@ -0,0 +1,201 @@
+"""Provides the game clock, which runs functions after a delay.
+
+Timers are kept in a hierarchical timing wheel: config.clock_levels wheels of
+config.clock_slots slots each. The first wheel has a slot for every tick of
+config.clock_resolution seconds, and each slot of the wheels above it covers a
+whole turn of the wheel below. Adding or cancelling a timer only touches one
+slot, so it takes the same time however many timers are waiting. When a wheel
+comes round, the timers in the next slot of the wheel above are moved down,
+so each timer is moved at most once per wheel before it fires.
+
+A single LoopingCall advances the wheel, catching up if the reactor was held
+up. How late each tick ran is recorded, and metrics returns it along with the
+number of waiting timers."""
+
+import logging
+from collections import Counter
+from math import ceil
+from time import monotonic
+from config import config
+
+__all__ = ['call_later', 'start', 'stop', 'metrics', 'Timer', 'TimingWheel']
+logger = logging.getLogger(__name__)
+
+
+class Timer:
+    """A function to be called at a given tick."""
+
+    __slots__ = ('tick', 'func', 'args', 'kwargs', 'slot')
+
+    def __init__(self, tick, func, args, kwargs):
+        self.tick = tick
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.slot = None  # The dictionary this timer is waiting in.
+
+    def active(self):
+        """Return whether this timer is still waiting to fire."""
+        return self.slot is not None
+
+    def cancel(self):
+        """Stop this timer from firing."""
+        if self.slot is not None:
+            del self.slot[self]
+            self.slot = None
+
+
+class TimingWheel:
+    """Timers which fire after a number of ticks."""
+
+    def __init__(self, slots=256, levels=4):
+        self.slots = slots
+        self.levels = levels
+        self.now = 0
+        # Each slot maps timers to None, so they fire in the order they were
+        # added.
+        self.wheels = [
+            [{} for x in range(slots)] for level in range(levels)
+        ]
+        # Timers too far away for any wheel.
+        self.overflow = {}
+        self.fired = 0
+
+    def __len__(self):
+        return sum(
+            len(slot) for wheel in self.wheels for slot in wheel
+        ) + len(self.overflow)
+
+    def schedule(self, ticks, func, *args, **kwargs):
+        """Call func with args and kwargs after ticks ticks, returning a
+        Timer."""
+        timer = Timer(self.now + max(1, ticks), func, args, kwargs)
+        self.place(timer)
+        return timer
+
+    def place(self, timer):
+        """Put timer in the right slot."""
+        delta = timer.tick - self.now
+        span = 1
+        for wheel in self.wheels:
+            if delta < span * self.slots:
+                slot = wheel[(timer.tick // span) % self.slots]
+                break
+            span *= self.slots
+        else:
+            slot = self.overflow
+        slot[timer] = None
+        timer.slot = slot
+
+    def advance(self, ticks=1):
+        """Move the clock on by ticks ticks, firing any timers which are
+        due."""
+        for x in range(ticks):
+            self.now += 1
+            self.cascade()
+            slot = self.wheels[0][self.now % self.slots]
+            while slot:
+                timer = next(iter(slot))
+                timer.cancel()
+                self.fired += 1
+                try:
+                    timer.func(*timer.args, **timer.kwargs)
+                except Exception:
+                    logger.exception('Timer %r failed.', timer.func)
+
+    def cascade(self):
+        """Move timers down from the wheels above which have come round,
+        starting with the highest."""
+        level = 0
+        while level < self.levels and not self.now % (
+            self.slots ** (level + 1)
+        ):
+            level += 1
+        if level == self.levels:
+            overflow = self.overflow
+            self.overflow = {}
+            self.redistribute(overflow)
+            level -= 1
+        for level in range(level, 0, -1):
+            index = (self.now // self.slots ** level) % self.slots
+            slot = self.wheels[level][index]
+            self.wheels[level][index] = {}
+            self.redistribute(slot)
+
+    def redistribute(self, slot):
+        """Place every timer in slot again."""
+        for timer in slot:
+            self.place(timer)
+
+
+# The wheel used by call_later. Created when first needed.
+wheel = None
+
+# The LoopingCall which advances the wheel.
+loop = None
+
+# When the wheel was at tick 0, according to monotonic.
+started = None
+
+# How late the most recent tick was, and the latest one so far, in seconds.
+lag = 0.0
+max_lag = 0.0
+
+# Counts ticks which ran late by more than a whole tick.
+stats = Counter()
+
+
+def get_wheel():
+    """Return the wheel, creating it if necessary."""
+    global wheel, started
+    if wheel is None:
+        wheel = TimingWheel(config.clock_slots, config.clock_levels)
+        started = monotonic()
+    return wheel
+
+
+def call_later(delay, func, *args, **kwargs):
+    """Call func with args and kwargs after delay seconds, returning a
+    Timer."""
+    # Allow for rounding errors, so 1.1 seconds is 11 ticks rather than 12.
+    ticks = ceil(delay / config.clock_resolution - 1e-9)
+    return get_wheel().schedule(ticks, func, *args, **kwargs)
+
+
+def tick():
+    """Advance the wheel to the current time."""
+    global lag, max_lag
+    w = get_wheel()
+    elapsed = monotonic() - started
+    lag = max(0.0, elapsed - (w.now + 1) * config.clock_resolution)
+    max_lag = max(lag, max_lag)
+    due = int(elapsed / config.clock_resolution) - w.now
+    if due > 1:
+        stats['late'] += 1
+    w.advance(due)
+
+
+def start():
+    """Start the clock."""
+    global loop
+    from twisted.internet.task import LoopingCall
+    get_wheel()
+    loop = LoopingCall(tick)
+    loop.start(config.clock_resolution, now=False)
+
+
+def stop():
+    """Stop the clock."""
+    global loop
+    if loop is not None:
+        loop.stop()
+        loop = None
+
+
+def metrics():
+    """Return a dictionary describing the state of the clock."""
+    w = get_wheel()
+    return dict(
+        timers=len(w), fired=w.fired, ticks=w.now, lag=lag, max_lag=max_lag,
+        late_ticks=stats['late']
+    )
@@ -0,0 +1,112 @@
+"""Looks up the hostnames of connecting clients without blocking.
+
+lookup returns a Deferred which fires with the hostname of an address, or the
+address itself if it doesn't have one. Lookups use Twisted's asynchronous
+resolver, so they never tie up a thread, and no more than
+config.dns_concurrency of them run at once. Answers are kept for
+config.dns_ttl seconds, and failures for config.dns_negative_ttl seconds, in
+a cache of at most config.dns_cache_size addresses. When an address is
+already being looked up, later lookups wait for the same answer."""
+
+import logging
+from collections import OrderedDict, Counter
+from ipaddress import ip_address
+from time import monotonic
+from twisted.internet.defer import Deferred, DeferredSemaphore, succeed
+from twisted.names import dns
+from config import config
+
+__all__ = ['lookup']
+logger = logging.getLogger(__name__)
+
+# The resolver to use. Set when first needed, unless tests replace it.
+resolver = None
+
+# Limits the number of lookups running at once.
+semaphore = None
+
+# Maps addresses to (hostname or None, expiry time) tuples, least recently
+# used first.
+cache = OrderedDict()
+
+# Maps addresses being looked up to the Deferreds waiting for them.
+pending = {}
+
+# Counts cache hits, misses and failed lookups.
+stats = Counter()
+
+
+def get_resolver():
+    """Return the resolver, creating it if necessary."""
+    global resolver
+    if resolver is None:
+        from twisted.names.client import getResolver
+        resolver = getResolver()
+    return resolver
+
+
+def get_semaphore():
+    """Return the semaphore which limits concurrent lookups."""
+    global semaphore
+    if semaphore is None:
+        semaphore = DeferredSemaphore(max(1, config.dns_concurrency))
+    return semaphore
+
+
+def lookup(address):
+    """Return a Deferred which fires with the hostname for address, or
+    address if it has none."""
+    entry = cache.get(address)
+    if entry is not None:
+        hostname, expires = entry
+        if expires > monotonic():
+            stats['hits'] += 1
+            cache.move_to_end(address)
+            return succeed(hostname or address)
+        del cache[address]
+    d = Deferred()
+    if address in pending:
+        pending[address].append(d)
+        return d
+    stats['misses'] += 1
+    pending[address] = [d]
+    get_semaphore().run(query, address).addBoth(finished, address)
+    return d
+
+
+def query(address):
+    """Ask the resolver for the name of address, returning a Deferred which
+    fires with the name, or None."""
+    name = ip_address(address).reverse_pointer
+    d = get_resolver().lookupPointer(name, timeout=(config.dns_timeout,))
+    d.addCallback(pointer_found)
+    return d
+
+
+def pointer_found(result):
+    """Return the name from the answers to a pointer query, or None."""
+    answers, authority, additional = result
+    for record in answers:
+        if record.type == dns.PTR:
+            return str(record.payload.name)
+
+
+def finished(result, address):
+    """A lookup of address has finished with result, which is a hostname,
+    None, or a Failure. Cache it, and pass it to everyone waiting."""
+    if isinstance(result, str):
+        hostname = result
+        ttl = config.dns_ttl
+    else:
+        if result is not None:
+            logger.debug(
+                'Could not look up %s: %s', address, result.getErrorMessage()
+            )
+        stats['failures'] += 1
+        hostname = None
+        ttl = config.dns_negative_ttl
+    cache[address] = (hostname, monotonic() + ttl)
+    while len(cache) > config.dns_cache_size:
+        cache.popitem(last=False)
+    for d in pending.pop(address):
+        d.callback(hostname or address)
@@ -1,19 +1,61 @@
-"""Provides the LogHandler class."""
+"""Provides the LogHandler class.
+
+Records are queued as they are logged, from any thread, and sent to every
+connected admin whose connection's log_level allows them, at most once per
+turn of the reactor. Admins are found in networking.admin_connections, so
+logging never touches the database. No more than config.log_queue_size
+records wait at once: any more are dropped and counted, and admins are told
+how many were lost."""
 
 from logging import Handler
 from twisted.internet import reactor
-from db import Character
+from config import config
+from networking import admin_connections
 
 
 class LogHandler(Handler):
     """Log messages inside the game."""
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.records = []
+        self.dropped = 0  # Since the last flush.
+        self.total_dropped = 0
+        self.scheduled = False
+
     def emit(self, record):
-        """Send the record in game."""
-        msg = f'[{record.levelname}] {record.name}: {record.getMessage()}'
-        reactor.callFromThread(self.send_message, msg)
+        """Queue the record to be sent in game."""
+        if len(self.records) >= config.log_queue_size:
+            self.dropped += 1
+            return
+        self.records.append(record)
+        if not self.scheduled:
+            self.scheduled = True
+            reactor.callFromThread(self.send_records)
 
-    def send_message(self, msg):
-        """Send msg to all connected admins."""
-        for c in Character.query(admin=True, connected=True):
-            c.notify(msg)
+    def send_records(self):
+        """Send queued records to all connected admins."""
+        self.acquire()
+        try:
+            records = self.records
+            dropped = self.dropped
+            self.records = []
+            self.dropped = 0
+            self.scheduled = False
+        finally:
+            self.release()
+        if not records and not dropped:
+            return
+        self.total_dropped += dropped
+        messages = [
+            (
+                record.levelno,
+                f'[{record.levelname}] {record.name}: {record.getMessage()}'
+            ) for record in records
+        ]
+        for con in list(admin_connections.values()):
+            for level, msg in messages:
+                if level >= con.log_level:
+                    con.notify(msg)
+            if dropped:
+                con.notify(f'[WARNING] {dropped} log messages dropped.')
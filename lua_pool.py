@@ -0,0 +1,243 @@
+"""Provides a pool of worker processes for running Lua scripts.
+
+When config.lua_processes is more than 0, call_program_async sends scripts to
+lua_worker.py processes instead of running them on the reactor thread. Each
+worker has its own runtime, and can only reach the game through a narrow
+protocol: reading rows and notifying characters. A worker which takes longer
+than config.lua_time seconds is killed and replaced, and the script fails
+with BudgetExceeded.
+
+With no worker processes, call_program_async runs scripts with
+programming.call_program, and returns a Deferred which has already fired."""
+
+import json
+import logging
+import os
+import sys
+from collections import deque
+from time import monotonic
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred, maybeDeferred
+from twisted.internet.protocol import ProcessProtocol
+from config import config
+from db import Base, session
+from db.characters import connections
+from programming import call_program, exhausted, record_call, BudgetExceeded
+
+__all__ = ['call_program_async', 'start', 'stop']
+logger = logging.getLogger(__name__)
+
+worker_path = os.path.join(os.path.dirname(__file__), 'lua_worker.py')
+
+
+class ScriptError(Exception):
+    """A script failed in a worker process."""
+
+
+def encode(value):
+    """Convert value to something which can be sent to a worker."""
+    if isinstance(value, Base):
+        return {'table': value.__table__.name, 'id': value.id}
+    return value
+
+
+def read_row(table_name, id):
+    """Return a message describing the row with the given id in the table
+    called table_name."""
+    table = Base.metadata.tables.get(table_name)
+    if table is None:
+        return {'row': None}
+    with session() as s:
+        row = s.execute(table.select().where(table.c.id == id)).first()
+    if row is None:
+        return {'row': None}
+    refs = {}
+    for column in table.columns:
+        value = row[column.name]
+        if value is not None and column.foreign_keys and (
+            column.name.endswith('_id')
+        ):
+            fk = next(iter(column.foreign_keys))
+            refs[column.name[:-3]] = [fk.column.table.name, value]
+    return {
+        'row': json.loads(json.dumps(dict(row), default=str)), 'refs': refs
+    }
+
+
+class WorkerProtocol(ProcessProtocol):
+    """Talk to a single worker process."""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.buffer = b''
+        self.deferred = None
+        self.name = None
+        self.started = None
+        self.timeout = None
+
+    def send(self, **message):
+        """Send a message to the worker."""
+        self.transport.write(json.dumps(message).encode() + b'\n')
+
+    def run(self, name, key, code, arguments):
+        """Run code in the worker, returning a Deferred which fires with the
+        result."""
+        self.name = name
+        self.started = monotonic()
+        self.deferred = Deferred()
+        self.send(run=[key, code, arguments])
+        if config.lua_time:
+            self.timeout = reactor.callLater(config.lua_time, self.timed_out)
+        return self.deferred
+
+    def finish(self, failed):
+        """The current script has finished. Return its Deferred."""
+        if config.lua_profile:
+            record_call(self.name, self.started, failed)
+        if self.timeout is not None and self.timeout.active():
+            self.timeout.cancel()
+        self.timeout = None
+        d = self.deferred
+        self.deferred = None
+        return d
+
+    def timed_out(self):
+        """The current script took too long, so kill this worker."""
+        self.timeout = None
+        exhausted[self.name] += 1
+        logger.warning('Script %s went over its time budget.', self.name)
+        d = self.finish(True)
+        self.transport.signalProcess('KILL')
+        d.errback(
+            BudgetExceeded(
+                f'The script {self.name} took too long and was stopped.'
+            )
+        )
+
+    def outReceived(self, data):
+        *lines, self.buffer = (self.buffer + data).split(b'\n')
+        for line in lines:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                logger.warning('Lua worker sent %r.', line)
+                continue
+            self.message_received(message)
+
+    def errReceived(self, data):
+        logger.warning('Lua worker: %s', data.decode(errors='replace'))
+
+    def message_received(self, message):
+        """Handle a message from the worker."""
+        if 'notify' in message:
+            id, text = message['notify']
+            con = connections.get(id)
+            if con is not None:
+                con.notify(str(text))
+        elif 'get' in message:
+            self.send(**read_row(*message['get']))
+        elif self.deferred is not None:
+            d = self.finish('error' in message)
+            self.pool.release(self)
+            if 'error' in message:
+                d.errback(ScriptError(message['error']))
+            else:
+                d.callback(message['result'])
+
+    def processEnded(self, reason):
+        if self.deferred is not None:
+            self.finish(True).errback(
+                ScriptError(f'Lua worker died: {reason.getErrorMessage()}')
+            )
+        self.pool.worker_ended(self)
+
+
+class LuaPool:
+    """A pool of worker processes."""
+
+    def __init__(self, size):
+        self.size = size
+        self.workers = []
+        self.idle = []
+        self.waiting = deque()
+        self.stopping = False
+        for x in range(size):
+            self.start_worker()
+
+    def start_worker(self):
+        """Start a new worker."""
+        worker = WorkerProtocol(self)
+        reactor.spawnProcess(
+            worker, sys.executable, args=[
+                sys.executable, worker_path,
+                str(config.lua_memory), str(config.lua_cache_size)
+            ], env=os.environ
+        )
+        self.workers.append(worker)
+        self.idle.append(worker)
+
+    def run(self, name, key, code, arguments):
+        """Run code in the first free worker, returning a Deferred."""
+        if self.idle:
+            return self.idle.pop().run(name, key, code, arguments)
+        d = Deferred()
+        self.waiting.append((d, name, key, code, arguments))
+        return d
+
+    def release(self, worker):
+        """worker has finished its script."""
+        if self.waiting:
+            d, *args = self.waiting.popleft()
+            worker.run(*args).chainDeferred(d)
+        else:
+            self.idle.append(worker)
+
+    def worker_ended(self, worker):
+        """worker has exited, so replace it."""
+        self.workers.remove(worker)
+        if worker in self.idle:
+            self.idle.remove(worker)
+        if not self.stopping:
+            logger.warning('Restarting Lua worker.')
+            self.start_worker()
+            self.release(self.idle.pop())
+
+    def stop(self):
+        """Stop all workers."""
+        self.stopping = True
+        for worker in self.workers:
+            worker.transport.closeStdin()
+
+
+pool = None
+
+
+def start():
+    """Start config.lua_processes worker processes."""
+    global pool
+    logger.info('Starting %d Lua workers.', config.lua_processes)
+    pool = LuaPool(config.lua_processes)
+    reactor.addSystemEventTrigger('during', 'shutdown', stop)
+
+
+def stop():
+    """Stop the worker processes."""
+    global pool
+    if pool is not None:
+        logger.info('Stopping Lua workers.')
+        pool.stop()
+        pool = None
+
+
+def call_program_async(thing, column, **kwargs):
+    """Run the code stored in column of thing, returning a Deferred which
+    fires with its value."""
+    if pool is None:
+        return maybeDeferred(call_program, thing, column, **kwargs)
+    code = getattr(thing, column)
+    key = [thing.__table__.name, thing.id, column, hash(code)]
+    arguments = {
+        name: encode(value) for name, value in kwargs.items()
+        if value is not None
+    }
+    return pool.run(f'{column} of {thing}', key, code, arguments)
@@ -0,0 +1,201 @@
+"""Provides the Lua sandbox which game scripts run in.
+
+install is used both by programming, for scripts run by the game itself, and
+by lua_worker, for scripts run in worker processes, so scripts are isolated
+from each other the same way wherever they run. See programming for what the
+sandbox allows."""
+
+__all__ = ['install']
+
+# Returns the function which runs a script within its budget, and the
+# replacements for coroutine.create and coroutine.wrap which give new
+# coroutines the budget of the script creating them.
+limits_code = """
+    local budget_error = {}
+    local real_create = coroutine.create
+    -- The budget of the script running now, if any.
+    local running = nil
+    -- Give co the hook of the running script, so its budget cannot be
+    -- escaped by running code in a coroutine of its own.
+    local function hook(co)
+        if running ~= nil then
+            running.coroutines[co] = true
+            debug.sethook(
+                co, running.check, '', running.exceeded and 1 or running.step
+            )
+        end
+        return co
+    end
+    local function create(f)
+        return hook(real_create(f))
+    end
+    local function unwrap(ok, ...)
+        if ok then
+            return ...
+        end
+        error((...), 0)
+    end
+    local function wrap(f)
+        local co = create(f)
+        return function(...)
+            return unwrap(coroutine.resume(co, ...))
+        end
+    end
+    local function limited(f, env, instructions, seconds, step, now)
+        -- The hook is only set on the coroutines running the script, so this
+        -- function and any other scripts it calls are not counted.
+        local co = real_create(f)
+        local used, deadline, reason = 0, now() + seconds, nil
+        local budget = {
+            step = step, exceeded = false,
+            coroutines = setmetatable({}, {__mode = 'k'})
+        }
+        function budget.check()
+            used = used + step
+            if reason == nil then
+                if instructions > 0 and used > instructions then
+                    reason = 'instructions'
+                elseif seconds > 0 and now() > deadline then
+                    reason = 'time'
+                else
+                    return
+                end
+                -- Fail on every instruction from now on, so the script
+                -- cannot carry on by catching the error.
+                budget.exceeded = true
+                for c in pairs(budget.coroutines) do
+                    debug.sethook(c, budget.check, '', 1)
+                end
+            end
+            error(budget_error)
+        end
+        local previous = running
+        running = budget
+        hook(co)
+        local function finish(ok, ...)
+            running = previous
+            if reason ~= nil then
+                -- Even if the script caught the error.
+                return false, reason
+            elseif ok then
+                return true, ...
+            elseif ... == 'not enough memory' then
+                return false, 'memory'
+            end
+            error((...), 0)
+        end
+        return finish(coroutine.resume(co, env))
+    end
+    return limited, create, wrap
+"""
+
+# Returns the function which turns a table of variables into an environment
+# for a script, falling back to read-only proxies of the base table and the
+# standard library.
+environment_code = """
+    local base, create, wrap = ...
+    local real_rawset = rawset
+    -- The tables every script can see, which must never be changed.
+    local shared = setmetatable({}, {__mode = 'k'})
+    local function read_only()
+        error('The shared environment is read-only.', 2)
+    end
+    local function protect(t, index)
+        shared[t] = true
+        return setmetatable(t, {
+            __index = index,
+            __newindex = read_only,
+            __pairs = function() return next, index, nil end,
+            __metatable = false
+        })
+    end
+    -- Scripts see proxies of the standard library rather than _G and the
+    -- library tables themselves, so nothing they do is seen by the next
+    -- script. The debug library would let them get round that and their
+    -- budgets, and the module functions load code against the real _G, so
+    -- they do not see them at all.
+    local hidden = {
+        debug = true, package = true, require = true, dofile = true,
+        loadfile = true
+    }
+    local stdlib = {}
+    for name, value in pairs(_G) do
+        if hidden[name] then
+            -- Left out.
+        elseif type(value) == 'table' then
+            stdlib[name] = protect({}, value)
+        else
+            stdlib[name] = value
+        end
+    end
+    -- Coroutines are given the budget of the script which creates them.
+    local coroutines = {}
+    for name, value in pairs(coroutine) do
+        coroutines[name] = value
+    end
+    coroutines.create, coroutines.wrap = create, wrap
+    stdlib.coroutine = protect({}, coroutines)
+    stdlib.rawset = function(t, k, v)
+        if shared[t] then
+            error('The shared environment is read-only.', 2)
+        end
+        return real_rawset(t, k, v)
+    end
+    protect(base, stdlib)
+    stdlib._G = protect({}, base)
+    local mt = {__index = base}
+    -- Chunks are loaded into the environment of the code which loads them,
+    -- rather than the real _G. If that cannot be found (after a tail call,
+    -- say), they get a new environment of their own.
+    local real_load, getlocal, getinfo, getupvalue = load,
+        debug.getlocal, debug.getinfo, debug.getupvalue
+    local function caller_env()
+        -- Level 1 is this function, 2 is load and 3 is its caller.
+        local info = getinfo(3, 'f')
+        if info == nil then
+            return nil
+        end
+        local env = nil
+        local i = 1
+        while true do
+            local name, value = getlocal(3, i)
+            if name == nil then
+                break
+            elseif name == '_ENV' then
+                env = value  -- The last one shadows the others.
+            end
+            i = i + 1
+        end
+        i = 1
+        while env == nil do
+            local name, value = getupvalue(info.func, i)
+            if name == nil then
+                break
+            elseif name == '_ENV' then
+                env = value
+            end
+            i = i + 1
+        end
+        return env
+    end
+    stdlib.load = function(chunk, name, mode, env)
+        if env == nil then
+            env = caller_env() or setmetatable({}, mt)
+        end
+        -- Compiled chunks could do anything.
+        return real_load(chunk, name, 't', env)
+    end
+    -- Strings share a metatable whose __index is the real string table.
+    getmetatable('').__metatable = false
+    return function(vars)
+        return setmetatable(vars, mt)
+    end
+"""
+
+
+def install(lua, base):
+    """Set up the sandbox in the LuaRuntime lua, with base holding the helpers
+    every script can see. Returns (limited, new_environment)."""
+    limited, create, wrap = lua.execute(limits_code)
+    new_environment = lua.execute(environment_code, base, create, wrap)
+    return limited, new_environment
@@ -0,0 +1,148 @@
+"""Runs Lua scripts for the game in a process of its own.
+
+Started by lua_pool, with the memory limit in bytes and the number of
+compiled scripts to keep as arguments.
+
+Messages are JSON objects, one per line, read from stdin and written to
+stdout. Anything else written to stdout, such as the output of Lua's print,
+is sent to stderr instead, so it cannot get mixed up with messages. The game
+sends:
+
+* {"run": [key, code, arguments]}, which is answered with {"result": value}
+  or {"error": message}.
+
+While a script is running, the worker may send:
+
+* {"notify": [id, text]} to send text to a character, which needs no reply.
+* {"get": [table, id]} to read a row, which is answered with
+  {"row": columns, "refs": {name: [table, id]}} or {"row": null}.
+
+Rows are passed as {"table": table, "id": id}, and given to scripts as
+tables which read their columns (and the rows they refer to) from the game
+when first used. Scripts run in the same sandbox as they do in the game, from
+lua_sandbox, so one script cannot change what later ones see."""
+
+import json
+import os
+import sys
+from collections import OrderedDict
+from lupa import LuaRuntime, LuaMemoryError
+import lua_sandbox
+
+# Compiled code takes its environment as its first argument.
+env_prefix = 'local _ENV = ...; '
+
+# Messages go to the real stdout, and everything else to stderr.
+channel = os.fdopen(os.dup(sys.stdout.fileno()), 'w')
+os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+lua = LuaRuntime(max_memory=int(sys.argv[1]) or None)
+cache_size = int(sys.argv[2])
+
+# Scripts get the same read-only view of the standard library as they do in
+# the game, so they cannot change what later scripts in this worker see.
+new_environment = lua_sandbox.install(lua, lua.table())[1]
+
+# Maps keys to compiled functions, least recently used first.
+programs = OrderedDict()
+
+# Python functions must be wrapped before they can be metamethods.
+make_metatable = lua.eval(
+    'function(index) return {__index = function(t, k) return index(k) end} '
+    'end'
+)
+
+
+def send(**message):
+    """Send a message to the game."""
+    channel.write(json.dumps(message) + '\n')
+    channel.flush()
+
+
+def receive():
+    """Return the next message from the game, or None if it has gone away."""
+    line = sys.stdin.readline()
+    if line:
+        return json.loads(line)
+
+
+def get_row(table, id):
+    """Ask the game for a row."""
+    send(get=[table, id])
+    return receive()
+
+
+def make_proxy(table, id):
+    """Return a Lua table standing in for the row with the given id in
+    table."""
+    cache = {}
+
+    def index(name):
+        if name == 'id':
+            return id
+        elif name == 'notify':
+            # Works with both character.notify(text) and
+            # character:notify(text).
+            return lambda *args: send(notify=[id, args[-1]])
+        if not cache:
+            cache.update(get_row(table, id) or {})
+        row = cache.get('row') or {}
+        refs = cache.get('refs') or {}
+        if name in refs:
+            return make_proxy(*refs[name])
+        return row.get(name)
+
+    return lua.globals().setmetatable(lua.table(), make_metatable(index))
+
+
+def to_lua(value):
+    """Convert a value from the game."""
+    if isinstance(value, dict) and set(value) == {'table', 'id'}:
+        return make_proxy(value['table'], value['id'])
+    return value
+
+
+def from_lua(value):
+    """Convert a value for the game."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    elif isinstance(value, tuple):  # Several values were returned.
+        return [from_lua(x) for x in value]
+    return str(value)
+
+
+def run(key, code, arguments):
+    """Run code, compiling it if it is not already cached under key, which is
+    a list."""
+    key = tuple(key)
+    f = programs.get(key)
+    if f is None:
+        f = lua.compile(env_prefix + code)
+        programs[key] = f
+        if len(programs) > cache_size:
+            programs.popitem(last=False)
+    else:
+        programs.move_to_end(key)
+    env = new_environment(
+        lua.table_from(
+            {name: to_lua(value) for name, value in arguments.items()}
+        )
+    )
+    return from_lua(f(env))
+
+
+def main():
+    while True:
+        message = receive()
+        if message is None:
+            break
+        try:
+            send(result=run(*message['run']))
+        except LuaMemoryError:
+            send(error='The script used too much memory.')
+        except Exception as e:  # Scripts must never kill the worker.
+            send(error=str(e))
+
+
+if __name__ == '__main__':
+    main()
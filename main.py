@@ -1,15 +1,30 @@
 """Main entry point."""
 
 import logging
-from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
-from twisted.internet import reactor
-import config
-from util import server_version
+from argparse import (
+    ArgumentParser, ArgumentDefaultsHelpFormatter, Action, SUPPRESS
+)
+import startup
+from startup import phase
+
+
+class VersionAction(Action):
+    """Print the server version, which is only looked up when asked for."""
+
+    def __init__(self, option_strings, dest, **kwargs):
+        kwargs.update(nargs=0, default=SUPPRESS)
+        super().__init__(option_strings, dest, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        from util import server_version
+        parser.exit(message=f'{server_version()}\n')
+
 
 parser = ArgumentParser(formatter_class=ArgumentDefaultsHelpFormatter)
 
 parser.add_argument(
-    '-v', '--version', action='version', version=server_version()
+    '-v', '--version', action=VersionAction,
+    help='Show the version number and exit'
 )
 
 parser.add_argument(
@@ -22,6 +37,12 @@ parser.add_argument(
     help='The default logging level'
 )
 
+parser.add_argument(
+    '-p', '--profile-startup', action='store_true',
+    help='Log how long each module took to import and each step of startup '
+    'took to run'
+)
+
 
 def main(args):
     try:
@@ -30,23 +51,52 @@ def main(args):
         print('Unable to initialise logging: %s' % e)
         raise SystemExit
     logging.info('Starting the server...')
-    logging.info('Version: %s.', server_version())
-    config.config = config.Config.load(args.config_file)
-    from db import load_db, dump_db
-    load_db()
-    from networking import factory
-    listener = reactor.listenTCP(
-        config.config.port, factory, interface=config.config.interface
-    )
+    with phase('Importing Twisted'):
+        from twisted.internet import reactor
+        from twisted.internet.task import LoopingCall
+    with phase('Loading configuration'):
+        import config
+        config.config = config.Config.load(args.config_file)
+    with phase('Finding the version'):
+        from util import server_version
+        logging.info('Version: %s.', server_version())
+    with phase('Loading the database'):
+        from db import load_db, compact_db, snapshots
+        from db.engine import persistent
+        load_db()
+    if not persistent and config.config.snapshot_interval:
+        snapshots.start()
+    if config.config.lua_profile and config.config.lua_profile_interval:
+        from programming import log_profile
+        LoopingCall(log_profile).start(
+            config.config.lua_profile_interval, now=False
+        )
+    import game_clock
+    game_clock.start()
+    if config.config.lua_processes:
+        with phase('Starting Lua workers'):
+            import lua_pool
+            lua_pool.start()
+    with phase('Loading commands'):
+        from networking import factory
+    with phase('Listening'):
+        listener = reactor.listenTCP(
+            config.config.port, factory, interface=config.config.interface
+        )
     logging.info('Listening on %s:%d.', listener.interface, listener.port)
+    if args.profile_startup:
+        startup.report()
     from log_handler import LogHandler
     logging.getLogger().addHandler(LogHandler())
     reactor.run()
     logging.info('Server shutting down.')
-    dump_db()
+    if config.config.db_file:
+        compact_db()
     config.config.dump(args.config_file)
 
 
 if __name__ == '__main__':
     args = parser.parse_args()
+    if args.profile_startup:
+        startup.install()
     main(args)
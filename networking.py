@@ -2,40 +2,126 @@
 
 import logging
 import sys
-from socket import gethostbyaddr, error
+from collections import deque
+from contextlib import contextmanager
 from datetime import datetime
-from inspect import isclass
 from sqlalchemy import func
 from twisted.internet import reactor
 from twisted.internet.protocol import ServerFactory
+from twisted.internet.interfaces import IPushProducer
 from twisted.protocols.basic import LineReceiver
+from zope.interface import implementer
+from random_password import random_password
+import authentication
 import commands
-from commands.base import Command
-from db import Character, session, RoomCommand, Room, MatchError
+import db.engine
+from db import Session, Character, RoomCommand, Room, MatchError, workers
+from db.cache import get_direction, match_direction, get_room_commands
+from db.session import bound_session, remove_session
 from config import config
-from programming import manage_environment
+from programming import BudgetExceeded
+from lua_pool import call_program_async
+from game_clock import call_later
+from hostnames import lookup
+from util import Trie, pluralise
 
 encoding = sys.getdefaultencoding()
 logger = logging.getLogger(__name__)
 
 commands_table = {}
 
+# Maps the ids of logged in admins to their connections, so log messages can
+# be sent to them without a query.
+admin_connections = {}
+
 logger.info('Building commands table...')
-for x in dir(commands):
-    cls = getattr(commands, x)
-    if isclass(cls) and issubclass(cls, Command):
-        cmd = cls()
-        for alias in set([cmd.prog] + cmd.aliases):
-            alias = alias.lower().replace('_', '-')
-            logger.debug('%s => %r.', alias, cmd)
-            commands_table[alias] = cmd
+for cls in commands.discover():
+    # Parsers are only built when commands are first used.
+    cmd = cls()
+    for alias in set([cmd.prog] + cmd.aliases):
+        alias = alias.lower().replace('_', '-')
+        logger.debug('%s => %r.', alias, cmd)
+        commands_table[alias] = cmd
 n = len(set(commands_table.values()))
 if not n:
-    logger.warning('No commands loaded. Run build-commands.py first.')
+    logger.warning('No commands found in the commands package.')
     raise SystemExit
 else:
     logger.info('Commands loaded: %d.', n)
 
+# Lets commands be typed as any unambiguous prefix of their names or aliases.
+commands_trie = Trie(commands_table.items())
+
+
+def name_taken(name):
+    """Return True if there is already a character called name."""
+    return Character.query(
+        func.lower(Character.name) == name.lower()
+    ).count() > 0
+
+
+def resolve(character, name):
+    """Return what name means to character as a tuple of (kind, value), or
+    None if it means nothing.
+
+    kind is 'command' (with a Command instance), 'room command' (with the id
+    of a RoomCommand in the character's location), or 'direction' (with a
+    DirectionInfo instance). Exact names are tried before unambiguous
+    prefixes, and in both cases commands win over room commands, which win
+    over directions. Everything comes from memory once the room's commands
+    have been cached, so names which mean nothing never touch the
+    database."""
+    cmd = commands_table.get(name)
+    if cmd is not None and cmd.allowed(character):
+        return 'command', cmd
+    room_commands = get_room_commands(character.location_id)
+    id = room_commands.get(name)
+    if id is not None:
+        return 'room command', id
+    direction = get_direction(name)
+    if direction is not None:
+        return 'direction', direction
+    if not name:
+        return None
+    cmd = commands_trie.match(
+        name, check=lambda value: value.allowed(character)
+    )
+    if cmd is not None:
+        return 'command', cmd
+    id = room_commands.match(name)
+    if id is not None:
+        return 'room command', id
+    direction = match_direction(name)
+    if direction is not None:
+        return 'direction', direction
+    return None
+
+
+def find_password(name):
+    """Return the id and password of the character called name, or None."""
+    return Session.query(Character.id, Character.password).filter(
+        func.lower(Character.name) == name
+    ).first()
+
+
+@implementer(IPushProducer)
+class OutputProducer:
+    """Tells a Protocol when its transport has too much data to send, so it
+    can hold on to its output until the client catches up."""
+
+    def __init__(self, protocol):
+        self.protocol = protocol
+
+    def pauseProducing(self):
+        self.protocol.output_paused = True
+
+    def resumeProducing(self):
+        self.protocol.output_paused = False
+        self.protocol.flush()
+
+    def stopProducing(self):
+        pass
+
 
 class Protocol(LineReceiver):
 
@@ -51,59 +137,273 @@ class Protocol(LineReceiver):
         """Set the logger with an appropriate name."""
         self.logger = logging.getLogger('%s:%d' % (self.host, self.port))
 
-    def resolve_host(self):
-        """Try and get the proper hostname for this connection."""
-        try:
-            res = gethostbyaddr(self.host)
-            self.host = res[0]
+    def host_found(self, hostname):
+        """The hostname for this connection has been looked up."""
+        if hostname != self.host and not self.disconnected:
+            self.host = hostname
             self.reset_logger()
-        except error as e:
-            self.logger.warning('Failed to resolve hostname:')
-            self.logger.exception(e)
 
     def connectionMade(self):
         now = datetime.utcnow()
         self.connected_at = now
         self.idle_since = now
         self.object_id = None
+        self.character = None
+        # The number of SQL statements used by recent lines.
+        self.statements = deque(maxlen=100)
         self.intercept = None
+        self.authenticating = False
+        self.disconnected = False
+        # Output waiting to be written, as encoded lines.
+        self.output = []
+        self.output_size = 0
+        self.output_paused = False
+        self.output_dropped = 0
+        self.flush_call = None
+        # Disconnects this connection once it has been idle for too long.
+        self.idle_timer = None
+        if config.idle_timeout:
+            self.idle_timer = call_later(config.idle_timeout, self.check_idle)
+        # The lowest level of log message to send to this connection, if it
+        # is logged in as an admin.
+        self.log_level = logging.getLevelName(config.admin_log_level)
+        self.transport.registerProducer(OutputProducer(self), True)
         peer = self.transport.getPeer()
         self.host = peer.host
         self.port = peer.port
-        reactor.callInThread(self.resolve_host)
         self.reset_logger()
+        lookup(self.host).addCallback(self.host_found)
         self.logger.info('Connected.')
         self.factory.connections.append(self)
         self.username = None
         self.notify(config.motd)
 
+    def check_idle(self):
+        """Disconnect this connection if it has been idle for
+        config.idle_timeout seconds, or check again when it could have
+        been."""
+        self.idle_timer = None
+        if not config.idle_timeout:
+            return
+        remaining = config.idle_timeout - self.idle_time.total_seconds()
+        if remaining > 0:
+            self.idle_timer = call_later(remaining, self.check_idle)
+        else:
+            self.logger.info('Disconnecting idle connection.')
+            self.notify('You have been idle for too long.')
+            self.disconnect()
+
     def connectionLost(self, reason):
         self.logger.info(reason.getErrorMessage())
+        self.disconnected = True
+        if self.flush_call is not None and self.flush_call.active():
+            self.flush_call.cancel()
+        if self.idle_timer is not None:
+            self.idle_timer.cancel()
+        self.output.clear()
+        self.forget_admin()
         self.factory.connections.remove(self)
-        if self.object is not None:
-            with session() as s:
+        with bound_session(self) as s:
+            if self.object is not None:
                 self.object.connected = False
                 self.object.connection = None
                 s.add(self.object)
+        self.character = None
+        remove_session(self)
 
     @property
     def object(self):
+        """The character this connection is logged in as. The character is
+        kept in this connection's session between lines, so this is usually
+        an identity map lookup rather than a query."""
         if self.object_id is not None:
             return Character.get(self.object_id)
 
     @object.setter
     def object(self, character):
+        # Keeping a reference stops the character falling out of the
+        # session's identity map.
+        self.character = character
         if character is None:
+            self.forget_admin()
             self.object_id = None
             return
         self.logger.info('Authenticated as %s.', character.name)
         self.object_id = character.id
         character.connection = self
         character.connected = True
+        if character.admin:
+            admin_connections[character.id] = self
+
+    def forget_admin(self):
+        """Stop sending log messages to this connection."""
+        if admin_connections.get(self.object_id) is self:
+            del admin_connections[self.object_id]
 
     def notify(self, string):
-        """Send a string of text to this connection."""
-        self.sendLine(string.encode())
+        """Send a string of text to this connection.
+
+        Text is buffered, and everything sent while handling a line, or
+        during one turn of the reactor, is written at once."""
+        if self.disconnected:
+            return
+        data = string.encode() + self.delimiter
+        if self.output_size + len(data) > config.output_buffer_size:
+            return self.output_overflowed()
+        self.output.append(data)
+        self.output_size += len(data)
+        if self.flush_call is None:
+            self.flush_call = reactor.callLater(0, self.flush)
+
+    def flush(self):
+        """Write any buffered output, unless the client is not keeping up."""
+        if self.flush_call is not None:
+            if self.flush_call.active():
+                self.flush_call.cancel()
+            self.flush_call = None
+        if self.output_paused or self.disconnected:
+            return
+        if self.output_dropped:
+            self.output.append(
+                f'*** {self.output_dropped} '
+                f'{pluralise(self.output_dropped, "line")} of output '
+                'dropped. ***'.encode() + self.delimiter
+            )
+            self.output_dropped = 0
+        if self.output:
+            self.transport.write(b''.join(self.output))
+            self.output.clear()
+            self.output_size = 0
+
+    def output_overflowed(self):
+        """This connection has more than config.output_buffer_size bytes of
+        output waiting, so do what config.output_overflow says."""
+        if config.output_overflow == 'drop':
+            self.output_dropped += 1
+        else:
+            self.logger.warning(
+                'Disconnecting: more than %d bytes of output waiting.',
+                config.output_buffer_size
+            )
+            self.output.clear()
+            self.output_size = 0
+            self.disconnected = True
+            self.transport.abortConnection()
+
+    def disconnect(self):
+        """Send any buffered output, then close the connection."""
+        self.output_paused = False
+        self.flush()
+        self.transport.loseConnection()
+
+    def login_failed(self):
+        """The user got their password wrong."""
+        self.notify('Incorrect password.')
+        self.username = None
+        self.notify('Username:')
+
+    def login(self, character_id):
+        """Log this connection in as the character with the given id and tell
+        them where they are."""
+        self.object = Character.get(character_id)
+        # All checks should have been performed now. Let's tell the user where
+        # they are.
+        self.object.show_location()
+
+    def name_checked(self, taken, name):
+        """The database pool has checked whether a new character name is
+        taken."""
+        if self.disconnected:
+            return
+        if taken:
+            return self.notify(
+                'That character name is taken. Please choose another.'
+            )
+        password = random_password()
+        d = authentication.encrypt(password)
+        d.addCallback(self.create_character, name.title(), password)
+        return d
+
+    def password_found(self, row, password):
+        """The database pool has looked up the character being logged in
+        as."""
+        if self.disconnected:
+            return
+        if row is None or row.password is None:
+            return self.login_failed()
+        d = authentication.verify(password, row.password)
+        d.addCallback(self.password_checked, row.id)
+        return d
+
+    def password_checked(self, valid, character_id):
+        """The password pool has verified (or not) a login attempt."""
+        if self.disconnected:
+            return
+        with bound_session(self):
+            if valid:
+                self.login(character_id)
+            else:
+                self.login_failed()
+
+    def create_character(self, hash, name, password):
+        """The password pool has hashed the password for a new character."""
+        if self.disconnected:
+            return
+        with bound_session(self) as s:
+            if Character.query(
+                func.lower(Character.name) == name.lower()
+            ).count():
+                # Somebody else took the name while we were hashing.
+                self.notify('That character name is taken. Goodbye.')
+                return self.disconnect()
+            c = Character(name=name, password=hash)
+            s.add(c)
+            c.location = Room.first()
+            s.commit()
+            self.logger.info('Created character %s.', c)
+            self.login(c.id)
+            self.notify(f'Your new password is {password}.')
+
+    def authentication_failed(self, failure):
+        """Hashing failed or the password pool is full."""
+        if failure.check(authentication.AuthenticationBusy):
+            self.logger.warning('Authentication queue full.')
+            msg = 'The server is busy. Please try again shortly.'
+        else:
+            self.logger.warning('Authentication failed:')
+            self.logger.error(failure.getTraceback())
+            msg = 'There was a problem logging you in.'
+        if not self.disconnected:
+            self.notify(msg)
+            self.username = None
+            self.notify('Username:')
+
+    def authentication_done(self, result):
+        """Allow further lines to be processed."""
+        self.authenticating = False
+
+    def refresh(self):
+        """Expire everything in this connection's session, so it is reloaded
+        from the database when next used."""
+        with bound_session(self) as s:
+            s.expire_all()
+
+    @contextmanager
+    def count_statements(self):
+        """Record the number of SQL statements executed in this context."""
+        start = db.engine.statements
+        try:
+            yield
+        finally:
+            self.statements.append(db.engine.statements - start)
+
+    def room_command_failed(self, failure, name):
+        """A room command raised an error."""
+        if failure.check(MatchError, BudgetExceeded):
+            return self.notify(str(failure.value))
+        self.notify('There was a problem with your command.')
+        logger.warning('Room command %s caused an error:', name)
+        logger.error(failure.getTraceback())
 
     def set_intercept(self, i):
         """Intercept this connection with an instance of Intercept i."""
@@ -111,10 +411,17 @@ class Protocol(LineReceiver):
         i.connection = self
 
     def lineReceived(self, line):
-        """A line was received."""
+        """A line was received. Send all its output at once."""
+        try:
+            self.handle_line(line)
+        finally:
+            self.flush()
+
+    def handle_line(self, line):
+        """Deal with a line of input."""
         self.idle_since = datetime.utcnow()
         line = line.decode(encoding, 'replace')
-        with session() as s:
+        with self.count_statements(), bound_session(self):
             if self.intercept is not None:
                 return self.intercept.feed(line)
             if self.username is None:
@@ -125,42 +432,25 @@ class Protocol(LineReceiver):
                     msg = 'Password:'
                 return self.notify(msg)
             elif self.object is None:
+                if self.authenticating:
+                    return self.notify('Please wait...')
                 if self.username == config.new_character_command:
-                    if Character.query(
-                        func.lower(Character.name) == line
-                    ).count():
-                        return self.notify(
-                            'That character name is taken. Please choose '
-                            'another.'
-                        )
-                    elif not line:
+                    if not line:
                         self.notify(
                             'Character names cannot be blank. Goodbye.'
                         )
-                        return self.transport.loseConnection()
-                    else:
-                        c = Character(name=line.title())
-                        s.add(c)
-                        c.location = Room.first()
-                        s.commit()
-                        self.object = c
-                        self.logger.info('Created character %s.', c)
-                        self.notify(
-                            f'Your new password is {c.randomise_password()}.'
-                        )
+                        return self.disconnect()
+                    d = workers.run(name_taken, line)
+                    d.addCallback(self.name_checked, line)
                 else:
-                    c = Character.query(
-                        func.lower(Character.name) == self.username
-                    ).first()
-                    if c is None or not c.check_password(line):
-                        self.notify('Incorrect password.')
-                        self.username = None
-                        return self.notify('Username:')
-                    else:
-                        self.object = c
-                # All checks should have been performed now. Let's tell the
-                # user where they are.
-                return self.object.show_location()
+                    d = workers.run(find_password, self.username)
+                    d.addCallback(self.password_found, line)
+                # The login continues when the database and password pools
+                # are finished.
+                self.authenticating = True
+                d.addErrback(self.authentication_failed)
+                d.addBoth(self.authentication_done)
+                return
             if not line:
                 return  # Just a blank line.
             if line[0] in config.command_substitutions:
@@ -171,36 +461,26 @@ class Protocol(LineReceiver):
             if self.object is not None and self.object.log_commands:
                 self.object.log_command(line)
             command, rest = both
-            if command in commands_table and commands_table[
-                command
-            ].allowed(self.object):
+            found = resolve(self.object, command)
+            if found is None:
+                return self.notify("I don't understand that.")
+            kind, value = found
+            if kind == 'command':
                 try:
-                    return commands_table[command].run(self.object, rest)
+                    return value.run(self.object, rest)
                 except Exception as e:
                     return self.object.notify(
                         'Something went wrong with your command.'
                     )
-            cmd = RoomCommand.query(
-                name=command, location_id=self.object.location_id
-            ).first()
-            if cmd is not None:
-                try:
-                    with manage_environment(
-                        character=self.object, here=self.object.location,
-                        text=rest
-                    ) as lua:
-                        lua.execute(cmd.code)
-                except MatchError as e:
-                    self.object.notify(str(e))
-                except Exception as e:
-                    self.notify('There was a problem with your command.')
-                    logger.warning('Room command %s caused an error:', cmd)
-                    logger.exception(e)
-                return
-            direction = self.object.location.match_direction(line)
-            if direction is None:
-                return self.notify("I don't understand that.")
-            commands_table['go'].run(self.object, direction.name)
+            elif kind == 'room command':
+                cmd = RoomCommand.get(value)
+                d = call_program_async(
+                    cmd, 'code', character=self.object,
+                    here=self.object.location, text=rest
+                )
+                d.addErrback(self.room_command_failed, str(cmd))
+            else:
+                commands_table['go'].run(self.object, value.name)
 
 
 class Factory(ServerFactory):
@@ -1,41 +1,261 @@
-"""Provides the lua environment."""
+"""Provides the lua environment.
+
+Every script runs with an environment table of its own, holding the keyword
+arguments it was called with and any globals it sets. Everything else is read
+from a shared base table of helpers (db, util, logger and the permission
+checks), which in turn falls back to the Lua standard library. Scripts cannot
+write to the base, so they can run re-entrantly without clobbering each other.
+Code they load runs in their own environment, the metatable shared by all
+strings is locked, and the libraries which could reach the real globals (debug,
+package and the file loaders) are left out.
+
+Each call is also given a budget of instructions, time and memory, set in
+the configuration. A script which goes over budget is stopped with
+BudgetExceeded, so a runaway loop cannot hang the reactor. Coroutines share
+the budget of the script which creates them, and scripts cannot see the debug
+library, which would let them remove the hooks counting their instructions.
+
+When config.lua_profile is set, every call is timed and recorded in a
+ScriptStats instance in profile, keyed by script name. Times include any
+scripts called by the script being timed. Only the config.lua_profile_size
+most recently called scripts are kept.
+
+Code stored in the database (room events, exit checks and room commands) is
+run with call_program, which keeps the compiled Lua functions in a least
+recently used cache keyed by (table, id, column, hash of the code). Entries
+are forgotten as soon as their code is changed or their row is deleted."""
 
 import logging
-from contextlib import contextmanager
-from lupa import LuaRuntime
+from collections import Counter, OrderedDict, deque
+from time import monotonic
+from attr import attrs, attrib, Factory
+from lupa import LuaRuntime, LuaMemoryError
+from sqlalchemy import inspect
 import db
+import lua_sandbox
 import util
+from config import config
 from permissions import (
     check_privileges, check_builder, check_admin, check_programmer
 )
 
 
 logger = logging.getLogger(__name__)
-lua = LuaRuntime()
+# Memory is only accounted for when the runtime has a limit.
+lua = LuaRuntime(max_memory=config.lua_max_memory or None)
+
+# Maps (table, id, column, hash) to compiled Lua functions, least recently used
+# first.
+programs = OrderedDict()
+
+# Compiled code takes its environment as its first argument.
+env_prefix = 'local _ENV = ...; '
 
-lua.globals()['logger'] = logger
+base = lua.table(logger=logger)
 for thing in (
     db, util, check_privileges, check_builder, check_admin, check_programmer
 ):
-    lua.globals()[thing.__name__] = thing
+    base[thing.__name__] = thing
+
+limited, new_environment = lua_sandbox.install(lua, base)
+
+budget_messages = {
+    'instructions': 'ran for too long',
+    'time': 'took too long',
+    'memory': 'used too much memory'
+}
+
+# Counts the number of times each script has gone over budget.
+exhausted = Counter()
+
+
+class BudgetExceeded(Exception):
+    """A script used more than its share of instructions, time or memory."""
+
+
+@attrs
+class ScriptStats:
+    """Timings for a single script."""
+
+    calls = attrib(default=Factory(int))
+    errors = attrib(default=Factory(int))
+    total = attrib(default=Factory(float))
+    # The durations of the most recent calls, used for percentiles.
+    recent = attrib(
+        default=Factory(lambda: deque(maxlen=config.lua_profile_samples))
+    )
+
+    def record(self, duration, failed):
+        """Record a call which took duration seconds."""
+        self.calls += 1
+        self.total += duration
+        self.recent.append(duration)
+        if failed:
+            self.errors += 1
+
+    @property
+    def average(self):
+        return self.total / self.calls
+
+    @property
+    def p99(self):
+        """The 99th percentile of recent call durations."""
+        durations = sorted(self.recent)
+        return durations[int(len(durations) * 0.99)]
+
+
+# Maps script names to ScriptStats instances, least recently called first.
+profile = OrderedDict()
+
+
+def record_call(name, started, failed):
+    """Record a call to the script called name which started at started."""
+    stats = profile.get(name)
+    if stats is None:
+        stats = ScriptStats()
+        profile[name] = stats
+        while len(profile) > config.lua_profile_size:
+            forgotten, _ = profile.popitem(last=False)
+            exhausted.pop(forgotten, None)
+    else:
+        profile.move_to_end(name)
+    stats.record(monotonic() - started, failed)
 
 
-@contextmanager
-def manage_environment(**kwargs):
-    """Add all kwargs to the lua environment for the lifetime of this
-    context."""
-    g = lua.globals()
+def hot_scripts(key='total', number=10):
+    """Return up to number (name, ScriptStats) pairs, sorted by key, which is
+    the name of a ScriptStats attribute."""
+    return sorted(
+        profile.items(), key=lambda item: getattr(item[1], key), reverse=True
+    )[:number]
+
+
+def log_profile():
+    """Log the scripts which have used the most time."""
+    for name, stats in hot_scripts(number=config.lua_profile_log_size):
+        logger.info(
+            '%s: %d calls (%d errors), %.1f ms total, %.2f ms average, '
+            '%.2f ms p99.', name, stats.calls, stats.errors,
+            stats.total * 1000, stats.average * 1000, stats.p99 * 1000
+        )
+
+
+def environment(**kwargs):
+    """Return a new environment table containing kwargs."""
+    return new_environment(
+        lua.table_from(
+            {
+                name: value for name, value in kwargs.items()
+                if value is not None
+            }
+        )
+    )
+
+
+def compile_code(code):
+    """Return code compiled into a Lua function which takes its environment as
+    its only argument."""
+    return lua.compile(env_prefix + code)
+
+
+def run(name, f, env):
+    """Call the compiled function f with environment env, within the budget
+    from the configuration. Return its value, or raise BudgetExceeded."""
+    previous = None
+    if config.lua_max_memory and config.lua_memory:
+        previous = lua.get_max_memory(total=True)
+        lua.set_max_memory(
+            min(previous, lua.get_memory_used(total=True) + config.lua_memory),
+            total=True
+        )
+    started = monotonic()
+    failed = True
     try:
-        for name, value in kwargs.items():
-            g[name] = value
-        yield lua
+        result = limited(
+            f, env, config.lua_instructions, config.lua_time,
+            config.lua_hook_step, monotonic
+        )
+        if not isinstance(result, tuple):
+            result = (result,)
+        failed = not result[0]
+    except LuaMemoryError:
+        result = (False, 'memory')
     finally:
-        for name, value in kwargs.items():
-            g[name] = None
+        if previous is not None:
+            lua.set_max_memory(previous, total=True)
+        if config.lua_profile:
+            record_call(name, started, failed)
+    if not result[0]:
+        exhausted[name] += 1
+        logger.warning('Script %s went over its %s budget.', name, result[1])
+        raise BudgetExceeded(
+            f'The script {name} {budget_messages[result[1]]} and was stopped.'
+        )
+    result = result[1:]
+    if not result:
+        return None
+    elif len(result) == 1:
+        return result[0]
+    return result
+
+
+def as_function(code, _name='code', **kwargs):
+    """Execute code like a function returning its value, in a new environment
+    containing the provided keyword arguments."""
+    return run(_name, compile_code(code), environment(**kwargs))
+
+
+def get_program(code, key):
+    """Return code compiled into a Lua function, compiling it only if it is not
+    already cached under key."""
+    f = programs.get(key)
+    if f is None:
+        f = compile_code(code)
+        programs[key] = f
+        if len(programs) > config.lua_cache_size:
+            programs.popitem(last=False)
+    else:
+        programs.move_to_end(key)
+    return f
+
+
+def call_program(thing, column, **kwargs):
+    """Run the code stored in column of thing like a function returning its
+    value, in a new environment containing the provided keyword arguments."""
+    code = getattr(thing, column)
+    f = get_program(code, (thing.__table__.name, thing.id, column, hash(code)))
+    return run(f'{column} of {thing}', f, environment(**kwargs))
+
+
+def code_columns(mapper):
+    """Return the names of the columns of mapper which hold code."""
+    return [
+        column.key for column in mapper.columns
+        if isinstance(column.type, db.base.Code)
+    ]
+
+
+def forget_programs(target, columns):
+    """Remove any cached code for the given columns of target."""
+    table = target.__table__.name
+    for key in list(programs):
+        if key[0] == table and key[1] == target.id and key[2] in columns:
+            del programs[key]
+
+
+def program_updated(mapper, connection, target):
+    """Forget the old versions of any code which target's update changed."""
+    state = inspect(target)
+    columns = [
+        name for name in code_columns(mapper)
+        if state.attrs[name].history.has_changes()
+    ]
+    if columns:
+        forget_programs(target, columns)
 
 
-def as_function(code, **kwargs):
-    """Execute code like a function returning its value. Use manage_environment
-    with the provided keyword arguments."""
-    with manage_environment(**kwargs) as runtime:
-        return runtime.execute(code)
+def program_deleted(mapper, connection, target):
+    """Forget all the code belonging to target, which has been deleted."""
+    columns = code_columns(mapper)
+    if columns:
+        forget_programs(target, columns)
@@ -0,0 +1,99 @@
+"""Compare how long it takes to send socials to a busy room with
+emote_utils, and with compiled templates."""
+
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from time import time
+import config
+config.config = config.Config()
+
+parser = ArgumentParser(
+    description=__doc__, formatter_class=ArgumentDefaultsHelpFormatter
+)
+parser.add_argument(
+    '-p', '--people', type=int, default=50,
+    help='The number of people in the room'
+)
+parser.add_argument(
+    '-n', '--number', type=int, default=2000,
+    help='The number of socials to send'
+)
+parser.add_argument(
+    'strings', nargs='*', default=[
+        '%1n say%1s: "{text}"', '%1N smile%1s to %1himself.',
+        '%1N sit%1s down to rest.'
+    ], help='The social strings to send'
+)
+
+
+class Connection:
+    """Throws notifications away."""
+
+    def __init__(self, character):
+        self.character = character
+        self.object_id = character.id
+
+    def notify(self, string):
+        pass
+
+
+def old_do_social(character, string, **kwargs):
+    """Send string the way Character.do_social used to: parsing it every
+    time, and sending it to everything in the room."""
+    from socials import socials
+    strings = socials.get_strings(string, [character], **kwargs)
+    for obj in character.get_visible():
+        if obj is character:
+            msg = strings[0]
+        else:
+            msg = strings[-1]
+        if obj.connection is not None:
+            obj.notify(msg)
+
+
+def old_get_gender(character):
+    """Load a gender the way Character.get_gender used to."""
+    from db import Gender
+    return Gender.get(character.gender_id or 1)
+
+
+def main(args):
+    from db import Character, Gender, Room, Zone, session
+    with session() as s:
+        s.add(Gender(name='Neutral'))
+        zone = Zone(name='Benchmark Zone')
+        room = Room(name='Busy Room', zone=zone)
+        s.add_all([zone, room])
+        s.commit()
+        people = []
+        for n in range(args.people):
+            c = Character(name=f'Person {n}', location=room)
+            s.add(c)
+            people.append(c)
+        s.commit()
+        for c in people:
+            c.connection = Connection(c)
+        speaker = people[0]
+        for string in args.strings:
+            timings = []
+            for social in (old_do_social, Character.do_social):
+                get_gender = Character.get_gender
+                if social is old_do_social:
+                    Character.get_gender = old_get_gender
+                try:
+                    started = time()
+                    for x in range(args.number):
+                        social(speaker, string, text='Hello everyone.')
+                    timings.append(
+                        (time() - started) / args.number * 1000000
+                    )
+                finally:
+                    Character.get_gender = get_gender
+            print(
+                f'{string}: {timings[0]:.1f} microseconds before, '
+                f'{timings[1]:.1f} after ({timings[0] / timings[1]:.1f}x '
+                'faster).'
+            )
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())
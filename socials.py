@@ -1,11 +1,105 @@
-"""Provides the socials factory."""
+"""Provides the socials factory, and compiled social templates.
 
+socials.get_strings parses its template every time it is called. The
+get_strings function here gives the same results, but parses each distinct
+template once into a Template, which is kept in a cache of
+config.social_cache_size templates, and can then be rendered for any list of
+perspectives without touching the template text again."""
+
+from collections import OrderedDict
+from attr import attrs, attrib
 from emote_utils import SocialsFactory
+from config import config
 
-__all__ = ['socials']
+__all__ = ['socials', 'get_strings', 'compile_template']
 
 socials = SocialsFactory()
 
+# Maps template strings to Template instances, least recently used first.
+templates = OrderedDict()
+
+
+@attrs(frozen=True)
+class Template:
+    """A parsed social string.
+
+    text is the string to format, with a {} for every suffix, and suffixes is
+    a tuple of (index, name, function, filter) tuples, one for each suffix,
+    where index is the 0-based index of the perspective it refers to, and
+    filter is a function or None."""
+
+    text = attrib()
+    suffixes = attrib()
+
+    def render(self, perspectives, **kwargs):
+        """Return a list of strings: one for each object in perspectives, and
+        one for everyone else."""
+        kwargs.setdefault('percent', '%')
+        replacements = [[] for perspective in perspectives]
+        others = []
+        for index, name, func, filter_func in self.suffixes:
+            try:
+                obj = perspectives[index]
+            except IndexError:
+                obj = socials.no_object(index)  # May raise.
+            this, other = func(obj, name)
+            if filter_func is not None:
+                this = filter_func(this)
+                other = filter_func(other)
+            for perspective, replacement in zip(perspectives, replacements):
+                replacement.append(this if perspective is obj else other)
+            others.append(other)
+        replacements.append(others)
+        return [self.text.format(*args, **kwargs) for args in replacements]
+
+
+def compile_template(string):
+    """Parse string into a Template, in the same way socials.get_strings
+    does."""
+    suffixes = []
+
+    def replace(match):
+        whole, index, name, filter_name = match.groups()
+        if index:
+            index = int(index) - 1
+        else:
+            index = socials.default_index - 1
+        if not name:
+            name = socials.default_suffix
+        func = socials.suffixes.get(name.lower())
+        if func is None:
+            func = socials.no_suffix(None, name)  # May raise.
+        if not filter_name:
+            if name.istitle():
+                filter_name = socials.title_case_filter
+            elif name.isupper():
+                filter_name = socials.upper_case_filter
+            else:
+                filter_name = socials.lower_case_filter
+        filter_func = None
+        if filter_name:
+            filter_func = socials.filters.get(filter_name)
+            if filter_func is None:
+                filter_func = socials.no_filter(None, filter_name)
+        suffixes.append((index, name, func, filter_func))
+        return '{}'
+
+    text = socials.suffix_re.sub(replace, string.replace('%%', '{percent}'))
+    return Template(text, tuple(suffixes))
+
+
+def get_strings(string, perspectives, **kwargs):
+    """Like socials.get_strings, but using a cached Template."""
+    template = templates.get(string)
+    if template is None:
+        template = compile_template(string)
+        templates[string] = template
+        if len(templates) > config.social_cache_size:
+            templates.popitem(last=False)
+    else:
+        templates.move_to_end(string)
+    return template.render(perspectives, **kwargs)
+
 
 @socials.suffix('n', 'name')
 def get_name(obj, suffix):
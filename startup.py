@@ -0,0 +1,113 @@
+"""Measures how long the server takes to start.
+
+Used by main.py when it is run with --profile-startup. While an ImportTimer is
+installed, it records how long every module takes to import, both on its own
+and including the modules it imports in turn. The steps of starting the
+server are timed with the phase context manager, and report logs the lot once
+the server is listening."""
+
+import logging
+import sys
+from contextlib import contextmanager
+from importlib.abc import MetaPathFinder
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+# When the timer was installed.
+started = None
+
+# The names and durations of each phase of startup, in the order they ran.
+phases = []
+
+
+class ImportTimer(MetaPathFinder):
+    """Time every module imported while installed in sys.meta_path."""
+
+    def __init__(self):
+        # Maps module names to (own time, total time) tuples.
+        self.timings = {}
+        # The total import time of the children of each module being
+        # imported.
+        self.stack = []
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        loader = spec.loader
+        # Built-in and frozen modules are loaded by classes shared by every
+        # module, so only loaders of a single module are wrapped.
+        if loader is not None and not isinstance(loader, type) and hasattr(
+            loader, 'exec_module'
+        ):
+            loader.exec_module = self.wrap(name, loader.exec_module)
+        return spec
+
+    def wrap(self, name, exec_module):
+        """Return a version of exec_module which records how long it
+        takes."""
+
+        def timed(module):
+            self.stack.append(0.0)
+            started = perf_counter()
+            try:
+                exec_module(module)
+            finally:
+                total = perf_counter() - started
+                own = total - self.stack.pop()
+                self.timings[name] = (own, total)
+                if self.stack:
+                    self.stack[-1] += total
+
+        return timed
+
+
+timer = None
+
+
+def install():
+    """Start timing imports."""
+    global started, timer
+    started = perf_counter()
+    timer = ImportTimer()
+    sys.meta_path.insert(0, timer)
+
+
+@contextmanager
+def phase(name):
+    """Time the code inside this context manager as a phase of startup."""
+    phase_started = perf_counter()
+    try:
+        yield
+    finally:
+        phases.append((name, perf_counter() - phase_started))
+
+
+def report(number=20):
+    """Log the time taken to start, the time taken by each phase, and the
+    number of modules which took longest to import."""
+    sys.meta_path.remove(timer)
+    logger.info(
+        'Started in %.0f ms.', (perf_counter() - started) * 1000
+    )
+    for name, duration in phases:
+        logger.info('%s: %.1f ms.', name, duration * 1000)
+    timings = sorted(
+        timer.timings.items(), key=lambda item: item[1][0], reverse=True
+    )
+    total = sum(own for own, cumulative in timer.timings.values())
+    logger.info(
+        'Imported %d modules in %.0f ms. The slowest were:',
+        len(timings), total * 1000
+    )
+    for name, (own, cumulative) in timings[:number]:
+        logger.info(
+            '%s: %.1f ms (%.1f ms including its imports).', name, own * 1000,
+            cumulative * 1000
+        )
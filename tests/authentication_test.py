@@ -0,0 +1,93 @@
+"""Test logging in."""
+
+from math import inf
+from time import monotonic
+from pytest import raises
+from twisted.internet import reactor
+from twisted.internet.address import IPv4Address
+from twisted.internet.error import ConnectionDone
+from twisted.internet.testing import StringTransport
+from twisted.python.failure import Failure
+import authentication
+import hostnames
+from config import Config, config
+from db import Character, Room, Zone, session
+from networking import factory
+from .conftest import wait
+
+
+def log_in(username, password):
+    """Try to log in, returning the protocol and everything it sent."""
+    # Keep the real resolver out of it.
+    hostnames.cache['127.0.0.1'] = ('localhost', inf)
+    address = IPv4Address('TCP', '127.0.0.1', 1)
+    protocol = factory.buildProtocol(address)
+    transport = StringTransport(peerAddress=address)
+    protocol.makeConnection(transport)
+    protocol.dataReceived(f'{username}\r\n{password}\r\n'.encode())
+    started = monotonic()
+    while protocol.authenticating:
+        assert monotonic() - started < 10, 'Timed out.'
+        reactor.iterate(0.01)
+    protocol.flush()
+    return protocol, transport.value().decode()
+
+
+with session() as s:
+    z = Zone(name='Authentication Zone')
+    r = Room(name='Authentication Room', zone=z)
+    c = Character(name='Authenticated Player', location=r)
+    c.set_password('secret')
+    s.add_all((z, r, c))
+    s.commit()
+    cid = c.id
+
+
+def teardown_module():
+    # The pool's threads would stop the tests from exiting.
+    authentication.stop_pool()
+
+
+def test_hashing():
+    hash = wait(authentication.encrypt('password'))
+    assert wait(authentication.verify('password', hash)) is True
+    assert wait(authentication.verify('wrong', hash)) is False
+
+
+def test_busy():
+    config.password_queue_size = 1
+    try:
+        authentication.get_pool()
+        # Take every thread, so attempts have to queue.
+        for x in range(config.password_threads):
+            authentication.semaphore.acquire()
+        queued = authentication.encrypt('password')
+        with raises(authentication.AuthenticationBusy):
+            wait(authentication.encrypt('password'))
+        for x in range(config.password_threads):
+            authentication.semaphore.release()
+        assert wait(queued).startswith('$')
+    finally:
+        config.password_queue_size = Config().password_queue_size
+
+
+def test_login():
+    protocol, output = log_in('authenticated player', 'secret')
+    assert 'Welcome, Authenticated Player.' in output
+    assert protocol.object_id == cid
+    protocol.connectionLost(Failure(ConnectionDone()))
+
+
+def test_wrong_password():
+    protocol, output = log_in('authenticated player', 'wrong')
+    assert 'Incorrect password.' in output
+    assert protocol.object is None
+    assert protocol.username is None
+    protocol.connectionLost(Failure(ConnectionDone()))
+
+
+def test_unknown_user():
+    protocol, output = log_in('nobody', 'secret')
+    assert 'Incorrect password.' in output
+    assert protocol.object is None
+    protocol.connectionLost(Failure(ConnectionDone()))
@@ -0,0 +1,67 @@
+"""Test the command log."""
+
+import os
+from queue import Queue
+import command_log
+from config import Config, config
+
+
+def test_command_log(tmp_path):
+    config.command_log_file = str(tmp_path / 'commands.log')
+    config.command_log_max_size = 1000
+    config.command_log_backups = 2
+    config.command_log_batch = 10
+    try:
+        for x in range(100):
+            command_log.log(x % 2 + 1, f'Person {x % 2 + 1}', f'say {x}')
+        command_log.stop()
+        entries = list(command_log.search())
+        assert command_log.stats['written'] == 100
+        assert command_log.stats['rotations'] > 2
+        rotated = command_log.rotated_files(config.command_log_file)
+        assert len(rotated) == 2
+        # The oldest files were removed.
+        assert entries[0]['command'] != 'say 0'
+        assert [e['command'] for e in entries] == [
+            f'say {x}' for x in range(100 - len(entries), 100)
+        ]
+        people = list(command_log.search(character='person 2'))
+        assert people == list(command_log.search(character=2))
+        assert all(e['name'] == 'Person 2' for e in people)
+        middle = entries[len(entries) // 2]['time']
+        assert list(command_log.search(since=middle, until=middle)) == [
+            e for e in entries if e['time'] == middle
+        ]
+        assert not list(command_log.search(until=entries[0]['time'] - 1))
+    finally:
+        command_log.stop()
+        for name in (
+            'command_log_file', 'command_log_max_size', 'command_log_backups',
+            'command_log_batch'
+        ):
+            setattr(config, name, getattr(Config(), name))
+    assert not os.path.exists('commands.log')
+
+
+def test_lost_lines(tmp_path):
+    writer = command_log.writer
+    queue = command_log.queue
+    # Leave the queue full, as if the writer had fallen behind.
+    command_log.writer = command_log.Writer(Queue(1))
+    command_log.queue = command_log.writer.queue
+    dropped = command_log.stats['dropped']
+    unwritten = command_log.stats['unwritten']
+    try:
+        for x in range(3):
+            command_log.log(1, 'Person 1', f'say {x}')
+        assert command_log.stats['dropped'] == dropped + 2
+        # A directory cannot be opened for writing.
+        command_log.writer.path = str(tmp_path)
+        command_log.writer.write(command_log.writer.gather())
+        assert command_log.stats['unwritten'] == unwritten + 1
+        assert command_log.writer.lost == (
+            command_log.stats['dropped'] + command_log.stats['unwritten']
+        )
+    finally:
+        command_log.writer = writer
+        command_log.queue = queue
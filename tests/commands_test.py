@@ -0,0 +1,47 @@
+"""Test command parsing."""
+
+from config import Config, config
+from networking import commands_table
+
+lines = (
+    '', 'here', 'north', 'hello world', 'a b c d', '1', '1 2', '12 north',
+    '1 2 3 4', 'hello "world"', '-h', '-1', 'a -b'
+)
+
+
+def test_fast_parser():
+    for name, cmd in commands_table.items():
+        cmd.build()
+        for line in lines:
+            args = cmd.fast_parser.parse(line)
+            if args is not None:
+                assert args == cmd.parse_args(line.split()), (name, line)
+
+
+def test_lazy_parsers():
+    cmd = type(commands_table['look'])()
+    assert not cmd.built
+    assert repr(cmd) == "Look(prog='look')"
+    assert cmd.fast_parser is None
+    assert cmd.parse_text('north').thing == 'north'
+    assert cmd.built
+
+
+class Notified:
+    """Records the messages it is sent."""
+
+    def __init__(self):
+        self.messages = []
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+def test_scripts_profiling_off():
+    character = Notified()
+    config.lua_profile = False
+    try:
+        commands_table['scripts'].func(character, None, '')
+    finally:
+        config.lua_profile = Config().lua_profile
+    assert character.messages == ['Script profiling is turned off.']
@@ -1,2 +1,25 @@
+"""Shared test setup and helpers."""
+
+from time import monotonic
 import config
 config.config = config.Config()
+
+
+def wait(d, timeout=10):
+    """Run the reactor until the Deferred d fires, and return its result,
+    raising it if it is a failure."""
+    from twisted.internet import reactor
+    from twisted.internet.process import reapAllProcesses
+    results = []
+    d.addBoth(results.append)
+    started = monotonic()
+    while not results:
+        assert monotonic() - started < timeout, 'Timed out.'
+        reactor.iterate(0.01)
+        # Without reactor.run there is no SIGCHLD handler to notice when
+        # child processes exit.
+        reapAllProcesses()
+    result = results[0]
+    if hasattr(result, 'raiseException'):
+        result.raiseException()
+    return result
@@ -1,9 +1,12 @@
 """Boring database tests."""
 
+from config import config
 from db import (
     Room, Character, session, Exit, Object, Guild, GuildSecondary, Direction,
     Zone
 )
+import game_clock
+from db.characters import occupants, regenerating
 
 
 with session() as s:
@@ -92,3 +95,134 @@ def test_match_direction():
         assert r.match_direction('t') is d
         assert r.match_direction('testing') is d
         assert r.match_direction('fails') is None
+
+
+def test_match_exit():
+    with session() as s:
+        r = Room.get(rid)
+        assert r.match_exit('sideways') is None
+        x = Exit(name='sideways', location_id=rid)
+        s.add(x)
+        s.commit()
+        assert r.match_exit('sideways') is x
+        x.name = 'testing'
+        s.commit()
+        assert r.match_exit('sideways') is None
+        assert r.match_exit('testing') is x
+        assert r.match_exit('t') is x  # Matched through the direction.
+        x.location_id = None
+        s.commit()
+        assert r.match_exit('testing') is None
+
+
+class FakeConnection:
+    """Collects notifications."""
+
+    def __init__(self, character):
+        self.character = character
+        self.object_id = character.id
+        self.lines = []
+
+    def notify(self, string):
+        self.lines.append(string)
+
+
+def test_occupants():
+    with session() as s:
+        r = Room.get(rid)
+        c = Character.get(cid)
+        other = Room(name='Other Room', zone_id=r.zone_id)
+        s.add(other)
+        s.commit()
+        con = FakeConnection(c)
+        c.connection = con
+        assert occupants[rid] == {cid: con}
+        r.broadcast('Hello.')
+        r.broadcast('Not you.', exclude=c)
+        c.move(other)
+        assert rid not in occupants
+        assert occupants[other.id] == {cid: con}
+        r.broadcast('Gone.')
+        c.connection = None
+        assert not occupants
+        assert con.lines == ['Welcome, Test Player.', 'Hello.']
+
+
+def test_regeneration():
+    previous = game_clock.wheel
+    wheel = game_clock.wheel = game_clock.TimingWheel()
+    ticks = round(config.regain_interval / config.clock_resolution)
+    try:
+        with session() as s:
+            c = Character(
+                name='Wounded Player', location_id=rid, max_hitpoints=10,
+                max_mana=3
+            )
+            s.add(c)
+            s.commit()
+            c.h = 5
+            c.m = 1
+            c.location.regain = 2
+            id = c.id
+        assert id in regenerating
+        wheel.advance(ticks)
+        with session() as s:
+            c = Character.get(id)
+            assert (c.h, c.hitpoints) == (7, 7)
+            assert (c.m, c.mana) == (3, None)
+        wheel.advance(ticks * 2)
+        assert Character.get(id).hitpoints is None
+        assert id not in regenerating
+        assert not len(wheel)
+    finally:
+        game_clock.wheel = previous
+
+
+def test_no_regain():
+    previous = game_clock.wheel
+    wheel = game_clock.wheel = game_clock.TimingWheel()
+    ticks = round(config.regain_interval / config.clock_resolution)
+    try:
+        with session() as s:
+            r = Room.get(rid)
+            still = Room(name='Still Room', zone_id=r.zone_id, regain=0)
+            c = Character(
+                name='Resting Player', location=still, max_hitpoints=10
+            )
+            s.add_all((still, c))
+            s.commit()
+            c.h = 5
+            id = c.id
+        wheel.advance(ticks)
+        # Nothing was regained, and the timer was not set again.
+        assert Character.get(id).hitpoints == 5
+        assert id not in regenerating
+        assert not len(wheel)
+        with session():
+            c = Character.get(id)
+            c.move(Room.get(rid))
+        assert id in regenerating
+        wheel.advance(ticks)
+        assert Character.get(id).hitpoints == 5 + Room.get(rid).regain
+    finally:
+        game_clock.wheel = previous
+
+
+def test_logout_timers():
+    previous = game_clock.wheel
+    wheel = game_clock.wheel = game_clock.TimingWheel()
+    try:
+        with session() as s:
+            c = Character(
+                name='Leaving Player', location_id=rid, max_mana=10
+            )
+            s.add(c)
+            s.commit()
+            c.connection = FakeConnection(c)
+            c.m = 1
+            assert c.id in regenerating
+            c.connection = None
+            assert c.id not in regenerating
+        assert not len(wheel)
+    finally:
+        game_clock.wheel = previous
@@ -0,0 +1,63 @@
+"""Test the persistent database engine."""
+
+import json
+import subprocess
+import sys
+from db import Zone, session, get_classes, dump_world
+
+# The engine is created when db is first imported, so each load runs in its
+# own process.
+script = '''
+import json, logging, sys
+import config
+config.config = config.Config(db_url=sys.argv[1], db_file=sys.argv[2])
+logging.basicConfig(level=logging.INFO, stream=sys.stderr)
+from db import Zone, load_db, session
+from db.engine import engine, persistent
+load_db()
+with engine.connect() as con:
+    pragmas = {
+        name: con.execute(f'PRAGMA {name}').scalar()
+        for name in config.config.sqlite_pragmas
+    }
+with session() as s:
+    zones = sorted(z.name for z in Zone.query())
+    if 'Persistent Zone' not in zones:
+        s.add(Zone(name='Persistent Zone'))
+print(json.dumps(dict(persistent=persistent, pragmas=pragmas, zones=zones)))
+'''
+
+
+def load(url, db_file):
+    """Load the database in a new process, returning what it found and what
+    it logged."""
+    result = subprocess.run(
+        [sys.executable, '-c', script, url, db_file], capture_output=True,
+        text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout), result.stderr
+
+
+def test_persistent(tmp_path):
+    with session() as s:
+        s.add(Zone(name='Imported Zone'))
+    db_file = str(tmp_path / 'world.yaml')
+    dump_world(db_file, get_classes(), 0)
+    url = f'sqlite:///{tmp_path / "world.db"}'
+    # An empty database is loaded from db_file.
+    found, logged = load(url, db_file)
+    assert found['persistent'] is True
+    assert 'Importing the database' in logged
+    assert 'Imported Zone' in found['zones']
+    assert 'Persistent Zone' not in found['zones']
+    assert found['pragmas'] == {
+        'journal_mode': 'wal', 'synchronous': 1, 'cache_size': -65536,
+        'mmap_size': 268435456, 'temp_store': 2
+    }
+    # After that, the database is used as it is.
+    found, logged = load(url, db_file)
+    assert 'Using the existing database' in logged
+    assert 'Importing the database' not in logged
+    assert found['zones'].count('Imported Zone') == 1
+    assert found['zones'].count('Persistent Zone') == 1
@@ -0,0 +1,94 @@
+"""Test the world file formats."""
+
+import os
+from pytest import skip
+from sqlalchemy import create_engine
+from db import Base, Zone, Room, session, get_classes, formats
+from db.engine import engine as game_engine
+from db.formats import reset_sequences, read_sequence
+
+
+class FakeDialect:
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeConnection:
+    """Records the statements it is given."""
+
+    def __init__(self, dialect):
+        self.dialect = FakeDialect(dialect)
+        self.statements = []
+
+    def execute(self, statement):
+        self.statements.append(str(statement))
+
+
+def test_reset_sequences():
+    con = FakeConnection('sqlite')
+    reset_sequences(con)
+    assert not con.statements
+    con = FakeConnection('postgresql')
+    reset_sequences(con)
+    assert len(con.statements) == len(Base.metadata.tables)
+    assert all('setval' in statement for statement in con.statements)
+
+
+def test_postgresql_sequences():
+    url = os.environ.get('TEST_POSTGRESQL_URL')
+    if not url:
+        skip('Set TEST_POSTGRESQL_URL to test against PostgreSQL.')
+    engine = create_engine(url)
+    table = Base.metadata.tables['zones']
+    try:
+        Base.metadata.drop_all(engine)
+        Base.metadata.create_all(engine)
+        with engine.begin() as con:
+            con.execute(table.insert(), [dict(id=5, name='Inserted')])
+            reset_sequences(con)
+            result = con.execute(table.insert(), [dict(name='Next')])
+            assert result.inserted_primary_key == [6]
+    finally:
+        Base.metadata.drop_all(engine)
+        engine.dispose()
+
+
+def rows(con):
+    """Return every row in every table, sorted."""
+    return {
+        table.name: sorted(
+            tuple(row) for row in con.execute(table.select()).fetchall()
+        ) for table in Base.metadata.tables.values()
+    }
+
+
+def round_trip(filename):
+    """Dump the world to filename, load it into an empty database, and check
+    that nothing was lost."""
+    with session() as s:
+        z = Zone(name='Round Trip Zone')
+        s.add_all((
+            z, Room(name='First Room', zone=z),
+            Room(name='Second Room', zone=z, lit=False)
+        ))
+    classes = get_classes()
+    formats.dump_world(filename, classes, 42)
+    assert read_sequence(filename) == 42
+    engine = create_engine('sqlite:///:memory:')
+    Base.metadata.create_all(engine)
+    formats.engine = engine
+    try:
+        assert formats.load_world(filename, classes) == 42
+        with game_engine.connect() as source, engine.connect() as target:
+            assert rows(target) == rows(source)
+    finally:
+        formats.engine = game_engine
+        engine.dispose()
+
+
+def test_sqlite(tmp_path):
+    round_trip(str(tmp_path / 'world.sqlite'))
+
+
+def test_yaml(tmp_path):
+    round_trip(str(tmp_path / 'world.yaml'))
@@ -0,0 +1,48 @@
+"""Test the game clock."""
+
+import game_clock
+from game_clock import TimingWheel, call_later, metrics
+
+
+def test_wheel():
+    wheel = TimingWheel(slots=4, levels=2)
+    fired = []
+
+    def fire(tick):
+        assert wheel.now == tick
+        fired.append(tick)
+
+    timers = {
+        tick: wheel.schedule(tick, fire, tick)
+        for tick in (1, 3, 4, 5, 15, 16, 17, 40, 100)
+    }
+    timers[5].cancel()
+    assert not timers[5].active()
+    assert len(wheel) == 8
+    wheel.advance(16)
+    assert fired == [1, 3, 4, 15, 16]
+    # Timers added part way round the wheels.
+    wheel.schedule(2, fire, 18)
+    wheel.schedule(23, fire, 39)
+    wheel.advance(100)
+    assert fired == [1, 3, 4, 15, 16, 17, 18, 39, 40, 100]
+    assert len(wheel) == 0
+    assert wheel.fired == 10
+
+
+def test_call_later():
+    previous = game_clock.wheel
+    game_clock.wheel = TimingWheel()
+    try:
+        fired = []
+        timer = call_later(0.25, fired.append, 'timer')
+        assert timer.tick == 3
+        assert metrics()['timers'] == 1
+        game_clock.wheel.advance(2)
+        assert not fired
+        game_clock.wheel.advance()
+        assert fired == ['timer']
+        assert metrics()['timers'] == 0
+        assert metrics()['fired'] == 1
+    finally:
+        game_clock.wheel = previous
@@ -0,0 +1,58 @@
+"""Test hostname lookups."""
+
+from twisted.internet.defer import Deferred, fail
+from twisted.names import dns
+from twisted.names.error import DNSNameError
+import hostnames
+from config import Config, config
+
+
+class FakeResolver:
+    """Answers pointer queries when told to."""
+
+    def __init__(self):
+        self.queries = {}
+
+    def lookupPointer(self, name, timeout=None):
+        if name.startswith('127.0.0.2.'):
+            return fail(DNSNameError(name))
+        d = Deferred()
+        self.queries[name] = d
+        return d
+
+    def answer(self, name, hostname):
+        record = dns.RRHeader(
+            name=name, type=dns.PTR, payload=dns.Record_PTR(hostname)
+        )
+        self.queries.pop(name).callback(([record], [], []))
+
+
+def test_lookup():
+    resolver = FakeResolver()
+    hostnames.resolver = resolver
+    hostnames.semaphore = None
+    hostnames.cache.clear()
+    config.dns_concurrency = 1
+    results = []
+    try:
+        for address in ('1.0.0.127', '1.0.0.127', '1.0.0.10'):
+            hostnames.lookup(address).addCallback(results.append)
+        # One lookup at a time, shared by both lookups of the same address.
+        assert list(resolver.queries) == ['127.0.0.1.in-addr.arpa']
+        resolver.answer('127.0.0.1.in-addr.arpa', 'example.com')
+        assert results == ['example.com', 'example.com']
+        resolver.answer('10.0.0.1.in-addr.arpa', 'example.org')
+        assert results[-1] == 'example.org'
+        hostnames.lookup('1.0.0.127').addCallback(results.append)
+        assert results[-1] == 'example.com'
+        assert not resolver.queries
+        # Failures give back the address, and are cached too.
+        for x in range(2):
+            hostnames.lookup('2.0.0.127').addCallback(results.append)
+            assert results[-1] == '2.0.0.127'
+        assert hostnames.stats['failures'] == 1
+        assert hostnames.cache['2.0.0.127'][0] is None
+    finally:
+        config.dns_concurrency = Config().dns_concurrency
+        hostnames.resolver = None
+        hostnames.semaphore = None
@@ -0,0 +1,42 @@
+"""Test the database journal."""
+
+from sqlalchemy import create_engine
+from config import Config, config
+from db import Base, Zone, Room, session, get_classes, journal
+
+
+def test_journal(tmp_path):
+    sequence = journal.sequence
+    config.journal_file = str(tmp_path / 'test.journal')
+    journal.start()
+    try:
+        with session() as s:
+            z = Zone(name='Journal Zone')
+            s.add(z)
+            s.commit()
+            r = Room(name='Journal Room', zone_id=z.id)
+            s.add(r)
+            s.commit()
+            z.name = 'Renamed Zone'
+            zid = z.id
+            rid = r.id
+        with session() as s:
+            s.delete(Room.get(rid))
+        journal.stop()
+        with open(config.journal_file, 'r') as f:
+            assert len(f.readlines()) == 4
+        engine = create_engine('sqlite:///:memory:')
+        Base.metadata.create_all(bind=engine)
+        with engine.connect() as con:
+            assert journal.replay(con, get_classes()) == 4
+            zones = con.execute(Zone.__table__.select()).fetchall()
+            assert len(zones) == 1
+            assert zones[0].id == zid
+            assert zones[0].name == 'Renamed Zone'
+            assert not con.execute(Room.__table__.select()).fetchall()
+            # Entries already included in a snapshot are skipped.
+            assert journal.replay(con, get_classes(), start=3) == 1
+    finally:
+        journal.stop()
+        config.journal_file = Config().journal_file
+        journal.sequence = sequence
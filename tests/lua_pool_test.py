@@ -0,0 +1,58 @@
+"""Test running scripts in worker processes."""
+
+from pytest import raises
+import lua_pool
+from config import Config, config
+from db import Room, Zone
+from db.session import bound_session, remove_session
+from programming import BudgetExceeded
+from .conftest import wait
+
+
+def run(owner, room, code, **kwargs):
+    """Set the on_enter code of room, and run it in a worker."""
+    with bound_session(owner):
+        room.on_enter = code
+    return wait(lua_pool.call_program_async(room, 'on_enter', **kwargs))
+
+
+def test_workers():
+    # Like a connection, keep a session open while the reactor runs.
+    owner = object()
+    config.lua_processes = 1
+    config.lua_time = 1
+    lua_pool.start()
+    try:
+        with bound_session(owner) as s:
+            z = Zone(name='Worker Zone')
+            s.add(z)
+            s.commit()
+            r = Room(name='Worker Room', zone_id=z.id)
+            s.add(r)
+        # Printing doesn't get mixed up with messages to the game.
+        assert run(
+            owner, r, 'print("Not a message."); return this.zone.name, a + 1',
+            this=r, a=1
+        ) == ['Worker Zone', 2]
+        with raises(BudgetExceeded):
+            run(owner, r, 'while true do end')
+        with raises(lua_pool.ScriptError):
+            run(owner, r, 'os.exit(1)')
+        # Dead workers are replaced.
+        assert run(owner, r, 'return 3') == 3
+        assert len(lua_pool.pool.workers) == 1
+        # Scripts run in the same worker cannot change what the next one
+        # sees.
+        with raises(lua_pool.ScriptError):
+            run(owner, r, 'string.upper = nil')
+        assert run(
+            owner, r, 'leaked = true; return string.upper("a")'
+        ) == 'A'
+        assert run(owner, r, 'return leaked') is None
+        assert len(lua_pool.pool.workers) == 1
+    finally:
+        lua_pool.stop()
+        remove_session(owner)
+        default = Config()
+        config.lua_processes = default.lua_processes
+        config.lua_time = default.lua_time
@@ -0,0 +1,135 @@
+"""Test connections."""
+
+from datetime import timedelta
+from logging import getLogger, DEBUG
+from twisted.internet.address import IPv4Address
+from twisted.internet.error import ConnectionDone
+from twisted.internet.testing import StringTransport
+from twisted.python.failure import Failure
+import game_clock
+from config import Config, config
+from db import Character, session
+from networking import factory
+
+closed = Failure(ConnectionDone())
+
+
+class CountingTransport(StringTransport):
+    """Counts writes."""
+
+    writes = 0
+
+    def write(self, data):
+        self.writes += 1
+        super().write(data)
+
+
+def connect():
+    protocol = factory.buildProtocol(IPv4Address('TCP', '127.0.0.1', 1))
+    transport = CountingTransport()
+    protocol.makeConnection(transport)
+    protocol.flush()
+    transport.clear()
+    transport.writes = 0
+    return protocol, transport
+
+
+def test_coalesced_output():
+    protocol, transport = connect()
+    for x in range(10):
+        protocol.notify(f'Line {x}.')
+    assert transport.value() == b''
+    protocol.flush()
+    assert transport.writes == 1
+    assert transport.value().count(b'\r\n') == 10
+    protocol.connectionLost(closed)
+
+
+def test_paused_output():
+    protocol, transport = connect()
+    transport.producer.pauseProducing()
+    protocol.notify('Waiting.')
+    protocol.flush()
+    assert transport.value() == b''
+    transport.producer.resumeProducing()
+    assert transport.value() == b'Waiting.\r\n'
+    protocol.connectionLost(closed)
+
+
+def test_overflow():
+    config.output_buffer_size = 20
+    try:
+        config.output_overflow = 'drop'
+        protocol, transport = connect()
+        for x in range(5):
+            protocol.notify('0123456789')
+        protocol.flush()
+        assert transport.value() == (
+            b'0123456789\r\n*** 4 lines of output dropped. ***\r\n'
+        )
+        protocol.connectionLost(closed)
+        config.output_overflow = 'disconnect'
+        protocol, transport = connect()
+        for x in range(5):
+            protocol.notify('0123456789')
+        assert transport.disconnecting
+        protocol.connectionLost(closed)
+    finally:
+        default = Config()
+        config.output_buffer_size = default.output_buffer_size
+        config.output_overflow = default.output_overflow
+
+
+def test_admin_log():
+    from log_handler import LogHandler
+    from networking import admin_connections
+    protocol, transport = connect()
+    with session() as s:
+        c = Character(name='Log Admin', admin=True)
+        s.add(c)
+        s.commit()
+        protocol.object = c
+    assert admin_connections[protocol.object_id] is protocol
+    handler = LogHandler()
+    logger = getLogger('test_admin_log')
+    logger.addHandler(handler)
+    logger.setLevel(DEBUG)
+    try:
+        logger.debug('Hidden.')
+        logger.info('Shown.')
+        config.log_queue_size = 3
+        logger.warning('Also shown.')
+        logger.warning('Dropped.')
+        handler.send_records()
+    finally:
+        logger.removeHandler(handler)
+        config.log_queue_size = Config().log_queue_size
+    protocol.flush()
+    assert transport.value().decode().splitlines()[-3:] == [
+        '[INFO] test_admin_log: Shown.',
+        '[WARNING] test_admin_log: Also shown.',
+        '[WARNING] 1 log messages dropped.'
+    ]
+    protocol.connectionLost(closed)
+    assert not admin_connections
+
+
+def test_idle_timeout():
+    previous = game_clock.wheel
+    wheel = game_clock.wheel = game_clock.TimingWheel()
+    ticks = round(config.idle_timeout / config.clock_resolution)
+    try:
+        protocol, transport = connect()
+        wheel.advance(ticks)
+        # The connection has only been idle for a moment, so it is checked
+        # again later.
+        assert not transport.disconnecting
+        assert len(wheel) == 1
+        protocol.idle_since -= timedelta(seconds=config.idle_timeout)
+        wheel.advance(ticks)
+        assert transport.disconnecting
+        assert b'idle' in transport.value()
+        protocol.connectionLost(closed)
+        assert not len(wheel)
+    finally:
+        game_clock.wheel = previous
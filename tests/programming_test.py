@@ -0,0 +1,145 @@
+"""Test the lua environment."""
+
+from lupa import LuaError
+from pytest import raises
+from config import Config, config
+from db import Room, Zone, session
+from programming import (
+    as_function, call_program, programs, exhausted, BudgetExceeded, profile,
+    hot_scripts, budget_messages
+)
+
+
+def test_program_cache():
+    with session() as s:
+        z = Zone(name='Programming Zone')
+        s.add(z)
+        s.commit()
+        r = Room(name='Programmed Room', zone_id=z.id, on_enter='return 1')
+        s.add(r)
+        s.commit()
+        assert call_program(r, 'on_enter') == 1
+        key = ('rooms', r.id, 'on_enter', hash('return 1'))
+        f = programs[key]
+        assert call_program(r, 'on_enter') == 1
+        assert programs[key] is f
+        r.on_enter = 'return 2'
+        s.commit()
+        assert key not in programs
+        assert call_program(r, 'on_enter') == 2
+        s.delete(r)
+        s.commit()
+        assert not [k for k in programs if k[:2] == ('rooms', r.id)]
+
+
+def test_environments():
+    def inner():
+        return as_function('leaked = true; return character', character=2)
+
+    assert as_function(
+        'local value = inner(); return character + value, leaked',
+        character=1, inner=inner
+    ) == (3, None)
+    assert as_function('return db') is not None
+
+
+def test_isolation():
+    assert as_function('x = 1; return x', _name='isolation') == 1
+    for code in (
+        '_G.x = 5', 'string.x = 5', 'rawset(_G, "x", 5)',
+        'rawset(string, "x", 5)', 'setmetatable(string, {})'
+    ):
+        with raises(LuaError):
+            as_function(code, _name='isolation')
+    assert as_function(
+        'return x, _G.x, string.x', _name='isolation'
+    ) == (None, None, None)
+    assert as_function(
+        'return string.upper("a"), _G.db ~= nil', _name='isolation'
+    ) == ('A', True)
+
+
+def test_shared_state():
+    for code in (
+        'load("string.lower = nil")()',
+        'getmetatable("").__index.upper = function() return "pwned" end',
+        'debug.setmetatable("", {})',
+        'package.loaded.string.lower = nil'
+    ):
+        with raises(LuaError):
+            as_function(code, _name='shared state')
+    assert as_function(
+        'return string.lower("A"), ("a"):upper()', _name='shared state'
+    ) == ('a', 'A')
+    # Loaded code runs in the environment of the script which loaded it.
+    assert as_function(
+        'load("x = 1")() return x', _name='shared state'
+    ) == 1
+    assert as_function('return x', _name='shared state') is None
+
+
+def test_budgets():
+    default = Config()
+    # Each budget is tested with the others turned off, so the reason given
+    # is the budget which was really exceeded.
+    for code, reason, settings in (
+        ('while true do end', 'instructions', dict(lua_time=0)),
+        (
+            'local t = {} for i = 1, 1e8 do t[i] = i end', 'memory',
+            dict(lua_instructions=0, lua_time=0)
+        ),
+        ('while true do end', 'time', dict(lua_instructions=0))
+    ):
+        for name, value in settings.items():
+            setattr(config, name, value)
+        try:
+            with raises(BudgetExceeded) as e:
+                as_function(code, _name=reason)
+            assert budget_messages[reason] in str(e.value)
+            assert exhausted[reason] == 1
+        finally:
+            for name in settings:
+                setattr(config, name, getattr(default, name))
+    assert as_function('return 1 + 1') == 2
+
+
+def test_profile():
+    for x in range(10):
+        as_function('return 1', _name='profiled')
+    stats = profile['profiled']
+    assert stats.calls == 10
+    assert stats.errors == 0
+    assert stats.p99 >= stats.average > 0
+    with raises(LuaError):
+        as_function('error("oops")', _name='profiled')
+    assert stats.errors == 1
+    assert hot_scripts(key='calls', number=1)[0][0] == 'profiled'
+
+
+def test_escaping_budgets():
+    assert as_function(
+        'return coroutine.wrap(function(x) return x + 1 end)(1)',
+        _name='escape'
+    ) == 2
+    for code in (
+        'return coroutine.wrap(function() while true do end end)()',
+        # The error is caught, but the script is still stopped.
+        'local co = coroutine.create(function() while true do end end) '
+        'return coroutine.resume(co)'
+    ):
+        with raises(BudgetExceeded):
+            as_function(code, _name='escape')
+    assert as_function('return debug', _name='escape') is None
+    with raises(LuaError):
+        as_function('debug.sethook() while true do end', _name='escape')
+
+
+def test_profile_size():
+    config.lua_profile_size = 2
+    try:
+        for name in ('first', 'second', 'first', 'third'):
+            as_function('return 1', _name=f'{name} profiled')
+        assert list(profile) == ['first profiled', 'third profiled']
+        assert 'second profiled' not in profile
+    finally:
+        config.lua_profile_size = Config().lua_profile_size
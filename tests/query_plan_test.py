@@ -0,0 +1,54 @@
+"""Make sure hot queries use indexes rather than scanning whole tables."""
+
+from pytest import fail
+from sqlalchemy import func
+from db import (
+    Session, Character, Exit, Room, RoomCommand, GuildSecondary,
+    WeaponSkillSecondary, SpellSecondary
+)
+from db.engine import engine
+
+
+def check_plan(query):
+    """Fail if the plan for query scans a whole table."""
+    compiled = query.statement.compile(
+        engine, compile_kwargs=dict(literal_binds=True)
+    )
+    for row in engine.execute(f'EXPLAIN QUERY PLAN {compiled}'):
+        detail = row[-1]
+        if detail.startswith('SCAN'):
+            fail(f'{detail}:\n{compiled}')
+
+
+def test_exits():
+    check_plan(Exit.query(location_id=1, name='north'))
+    check_plan(
+        Session.query(Exit.id, Exit.name).filter_by(
+            location_id=1
+        ).order_by(Exit.id)
+    )
+
+
+def test_room_commands():
+    check_plan(RoomCommand.query(name='pull', location_id=1))
+
+
+def test_coordinates():
+    check_plan(Room.query(x=1, y=2, z=3))
+
+
+def test_character_name():
+    check_plan(Character.query(func.lower(Character.name) == 'wizard'))
+
+
+def test_connected_admins():
+    check_plan(Character.query(admin=True, connected=True))
+
+
+def test_room_characters():
+    check_plan(Character.query(location_id=1))
+
+
+def test_secondaries():
+    for cls in (GuildSecondary, WeaponSkillSecondary, SpellSecondary):
+        check_plan(cls.query(character_id=1))
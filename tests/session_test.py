@@ -0,0 +1,42 @@
+"""Test bound sessions."""
+
+from db import Zone, Room, session
+from db.session import bound_session, remove_session
+
+
+class Owner:
+    """Something to own a session."""
+
+
+def test_bound_session():
+    first = Owner()
+    second = Owner()
+    with session() as s:
+        z = Zone(name='Session Zone')
+        s.add(z)
+        s.commit()
+        r = Room(name='Session Room', zone_id=z.id)
+        s.add(r)
+        s.commit()
+        rid = r.id
+    try:
+        with bound_session(first):
+            r = Room.get(rid)
+            assert r.name == 'Session Room'
+        with bound_session(first) as s:
+            # Still in the identity map.
+            assert rid in [key[1][0] for key in s.identity_map.keys()]
+            assert Room.get(rid) is r
+        with bound_session(second):
+            Room.get(rid).name = 'Renamed Room'
+        with bound_session(first):
+            assert Room.get(rid) is r
+            assert r.name == 'Renamed Room'
+        with bound_session(second) as s:
+            s.delete(Room.get(rid))
+        with bound_session(first) as s:
+            assert r not in s
+            assert Room.get(rid) is None
+    finally:
+        remove_session(first)
+        remove_session(second)
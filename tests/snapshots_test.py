@@ -0,0 +1,132 @@
+"""Test background snapshots."""
+
+import json
+import os
+from queue import Queue
+from threading import Thread
+from time import time
+from pytest import raises
+from config import Config, config
+from db import (
+    Zone, session, compact_db, snapshot_is_newest, journal, snapshots,
+    read_sequence, get_classes
+)
+from db.engine import engine
+
+
+class FakeReactor:
+    """Lets the test run the calls the worker makes from its thread."""
+
+    def __init__(self):
+        self.calls = Queue()
+
+    def callFromThread(self, func, *args):
+        self.calls.put((func, args))
+
+
+def take_snapshot(path):
+    """Take a snapshot to path, parking this thread as the reactor would be,
+    and return it."""
+    reactor = snapshots.reactor
+    snapshots.reactor = FakeReactor()
+    try:
+        snapshot = snapshots.Snapshot(path)
+        results = []
+        fairy = engine.raw_connection()
+        worker = Thread(
+            target=lambda: results.append(snapshot.run(fairy.connection))
+        )
+        worker.start()
+        while worker.is_alive() or not snapshots.reactor.calls.empty():
+            if not snapshots.reactor.calls.empty():
+                func, args = snapshots.reactor.calls.get()
+                func(*args)
+        worker.join()
+        fairy.close()
+        assert results
+        return snapshot
+    finally:
+        snapshots.reactor = reactor
+
+
+def add_zone(name):
+    with session() as s:
+        s.add(Zone(name=name))
+
+
+def test_compaction_during_snapshot(tmp_path):
+    config.journal_file = str(tmp_path / 'world.journal')
+    config.db_file = str(tmp_path / 'world.sqlite')
+    config.snapshot_file = str(tmp_path / 'snapshot.sqlite')
+    journal.start()
+    try:
+        add_zone('Before Snapshot')
+        late = str(tmp_path / 'late.sqlite')
+        snapshot = take_snapshot(late)
+        assert snapshot.sequence == journal.sequence
+        assert snapshot.steps
+        # More changes are made, then the world is dumped and the journal
+        # emptied before the snapshot is moved into place.
+        add_zone('After Snapshot')
+        compact_db()
+        assert read_sequence(config.db_file) > snapshot.sequence
+        os.replace(late, config.snapshot_file)
+        os.utime(config.snapshot_file, (time() + 60, time() + 60))
+        assert not snapshot_is_newest()
+        # A snapshot which includes everything in the dump is used.
+        add_zone('After Dump')
+        snapshot = take_snapshot(config.snapshot_file)
+        assert snapshot_is_newest()
+        assert snapshots.restore() == snapshot.sequence == journal.sequence
+        with session():
+            assert Zone.query(name='After Dump').count() == 1
+    finally:
+        journal.stop()
+        default = Config()
+        for name in ('journal_file', 'db_file', 'snapshot_file'):
+            setattr(config, name, getattr(default, name))
+
+
+def test_snapshot_compacts_journal(tmp_path):
+    config.journal_file = str(tmp_path / 'world.journal')
+    config.snapshot_file = str(tmp_path / 'snapshot.sqlite')
+    journal.start()
+    try:
+        for name in ('Snapshotted', 'Also Snapshotted'):
+            add_zone(name)
+        snapshot = take_snapshot(config.snapshot_file)
+        size = os.path.getsize(config.journal_file)
+        add_zone('Journalled')
+        snapshot.compact()
+        assert os.path.getsize(config.journal_file) < size
+        add_zone('Also Journalled')
+        with open(config.journal_file, 'r') as f:
+            entries = [json.loads(line) for line in f]
+        assert [e['data']['name'] for e in entries] == [
+            'Journalled', 'Also Journalled'
+        ]
+        assert all(e['seq'] > snapshot.sequence for e in entries)
+        # The snapshot and what is left of the journal hold everything.
+        assert snapshots.restore() == snapshot.sequence
+        with session() as s:
+            assert journal.replay(
+                s.connection(), get_classes(), start=snapshot.sequence
+            ) == 2
+        with session():
+            for name in (
+                'Snapshotted', 'Also Snapshotted', 'Journalled',
+                'Also Journalled'
+            ):
+                assert Zone.query(name=name).count() == 1
+    finally:
+        journal.stop()
+        default = Config()
+        for name in ('journal_file', 'snapshot_file'):
+            setattr(config, name, getattr(default, name))
+
+
+def test_abandoned_snapshot(tmp_path):
+    snapshot = snapshots.Snapshot(str(tmp_path / 'snapshot.sqlite'))
+    snapshot.abandoned = True
+    with raises(snapshots.SnapshotError):
+        snapshot.progress(0, 1, 2)
@@ -0,0 +1,36 @@
+"""Test compiled social templates."""
+
+from attr import attrs, attrib
+from pytest import raises
+from emote_utils import SocialsError
+from db.cache import GenderInfo
+from socials import socials, get_strings, templates
+
+gender = GenderInfo(1, 'Female', 'she', 'her', 'her', 'hers', 'herself')
+
+
+@attrs
+class Thing:
+    name = attrib()
+
+    def get_name(self):
+        return self.name
+
+    def get_gender(self):
+        return gender
+
+
+def test_get_strings():
+    perspectives = [Thing('Alice'), Thing('Bob')]
+    for string in (
+        '%1N smile%1s at %2n.', '%1n|upper wave%1s to %2 with %1his hand.',
+        '%1Ss hat falls off %2his head. 100%%.', '%1n say%1s: "{text}"',
+        'No suffixes here.', '%2He hurt%2s %2himself and %1n laugh%1s.'
+    ):
+        assert get_strings(
+            string, perspectives, text='Hi'
+        ) == socials.get_strings(string, perspectives, text='Hi')
+        assert string in templates
+    for string in ('%3n', '%1nonsense'):
+        with raises(SocialsError):
+            get_strings(string, perspectives)
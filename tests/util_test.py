@@ -0,0 +1,16 @@
+"""Test utility functions."""
+
+from util import Trie
+
+
+def test_trie():
+    t = Trie([('north', 1), ('northeast', 2), ('say', 3), ('@say', 3)])
+    t.add('north', 4)
+    assert t.get('north') == 1
+    assert t.get('nor') is None
+    assert t.complete('nor') == {1, 2}
+    assert t.match('nor') is None
+    assert t.match('northe') == 2
+    assert t.match('nor', check=lambda value: value > 1) == 2
+    assert t.match('s') == 3
+    assert t.match('x') is None
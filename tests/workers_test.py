@@ -0,0 +1,44 @@
+"""Test running database work off the reactor thread."""
+
+from threading import get_ident
+from db import Character, Session, session, workers
+from db.session import scope, get_scope
+from .conftest import wait
+
+
+def describe():
+    """Return the thread and session this function was called in."""
+    return get_ident(), get_scope(), Session()
+
+
+def test_in_memory():
+    scope.owner = 'connection'
+    try:
+        with session() as s:
+            d = workers.run(describe)
+            # An in-memory database can only be used on this thread, so the
+            # work has already been done.
+            assert d.called
+            thread, owner, other = wait(d)
+            assert thread == get_ident()
+            assert owner == get_ident()  # Not the bound session.
+            assert other is not s
+            assert get_scope() == 'connection'
+        d = workers.run(lambda: Character.count())
+        assert wait(d) == Character.count()
+    finally:
+        scope.owner = None
+
+
+def test_threads():
+    previous = workers.persistent
+    workers.persistent = True
+    try:
+        d = workers.run(describe)
+        thread, owner, s = wait(d)
+        assert thread != get_ident()
+        assert owner == thread
+        assert workers.pool is not None
+    finally:
+        workers.persistent = previous
+        workers.stop_pool()
@@ -1,11 +1,10 @@
 """Utility functions."""
 
-from subprocess import check_output, CalledProcessError
+import os.path
+from subprocess import check_output, CalledProcessError, DEVNULL
 
-try:
-    __version__ = check_output(['git', 'describe', '--tags']).strip().decode()
-except CalledProcessError:  # Probably not running inside git.
-    __version__ = 'Unknown'
+# The server version, found the first time server_version is called.
+__version__ = None
 
 
 def format_timedelta(td):
@@ -69,5 +68,78 @@ def english_list(
 
 
 def server_version():
-    """Get the server version."""
+    """Get the server version, asking git for it the first time."""
+    global __version__
+    if __version__ is None:
+        try:
+            __version__ = check_output(
+                ['git', 'describe', '--tags', '--always'], stderr=DEVNULL,
+                cwd=os.path.dirname(os.path.abspath(__file__))
+            ).strip().decode()
+        except (CalledProcessError, OSError):  # Probably not inside git.
+            __version__ = 'Unknown'
     return __version__
+
+
+class Trie:
+    """Map strings to values, and find values from unambiguous prefixes of
+    those strings.
+
+    Every node remembers the values stored anywhere beneath it, so finding
+    everything a prefix could mean only walks the prefix itself."""
+
+    __slots__ = ('children', 'values', 'value')
+
+    def __init__(self, items=()):
+        self.children = {}
+        self.values = set()
+        self.value = None
+        for key, value in items:
+            self.add(key, value)
+
+    def add(self, key, value):
+        """Store value under key, unless there is a value there already."""
+        nodes = [self]
+        for character in key:
+            child = nodes[-1].children.get(character)
+            if child is None:
+                child = nodes[-1].children[character] = Trie()
+            nodes.append(child)
+        if nodes[-1].value is None:
+            nodes[-1].value = value
+            for node in nodes:
+                node.values.add(value)
+
+    def find(self, key):
+        """Return the node for key, or None."""
+        node = self
+        for character in key:
+            node = node.children.get(character)
+            if node is None:
+                return None
+        return node
+
+    def get(self, key, default=None):
+        """Return the value stored under key, or default."""
+        node = self.find(key)
+        if node is None or node.value is None:
+            return default
+        return node.value
+
+    def complete(self, prefix):
+        """Return the set of values stored under keys starting with
+        prefix."""
+        node = self.find(prefix)
+        if node is None:
+            return set()
+        return node.values
+
+    def match(self, prefix, check=None):
+        """Return the only value stored under a key starting with prefix, or
+        None if there are none, or more than one. If check is given, only
+        values for which check(value) is true are counted."""
+        values = self.complete(prefix)
+        if check is not None:
+            values = [value for value in values if check(value)]
+        if len(values) == 1:
+            return next(iter(values))
@@ -0,0 +1,91 @@
+"""Compare how long it takes to load a generated world in each format."""
+
+import os
+import os.path
+from argparse import ArgumentParser, ArgumentDefaultsHelpFormatter
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from time import time
+import config
+config.config = config.Config()
+
+parser = ArgumentParser(
+    description=__doc__, formatter_class=ArgumentDefaultsHelpFormatter
+)
+parser.add_argument(
+    '-r', '--rows', type=int, default=1000000,
+    help='The number of rows to generate'
+)
+parser.add_argument(
+    '-f', '--formats', nargs='+', default=['.sqlite', '.yaml'],
+    help='The formats to compare'
+)
+
+
+def generate(rows):
+    """Fill the database with roughly rows rows: rooms, with one exit and one
+    object for each."""
+    from db import Zone, Room, Exit, Object, session
+    from db.engine import engine
+    with session() as s:
+        s.add(Zone(name='Benchmark Zone'))
+    now = datetime.utcnow()
+    rooms = rows // 3
+    with engine.begin() as con:
+        con.execute(
+            Room.__table__.insert(), [
+                dict(
+                    id=n, name=f'Room {n}', x=n, zone_id=1, created=now,
+                    _description='A room generated for benchmarking.'
+                ) for n in range(1, rooms + 1)
+            ]
+        )
+        for cls in (Exit, Object):
+            con.execute(
+                cls.__table__.insert(), [
+                    dict(
+                        name=f'{cls.__name__} {n}', location_id=n,
+                        created=now
+                    ) for n in range(1, rooms + 1)
+                ]
+            )
+    return sum(cls.count() for cls in (Zone, Room, Exit, Object))
+
+
+def reset():
+    """Empty the database."""
+    from db import Base, Session
+    from db.engine import engine
+    Session.remove()
+    with engine.begin() as con:
+        for table in Base.metadata.tables.values():
+            con.execute(table.delete())
+
+
+def main(args):
+    from db import get_classes
+    from db.formats import load_world, dump_world
+    classes = get_classes()
+    started = time()
+    n = generate(args.rows)
+    print(f'Generated {n} rows in {time() - started:.2f} seconds.')
+    with TemporaryDirectory() as directory:
+        filenames = []
+        for ext in args.formats:
+            filename = os.path.join(directory, f'world{ext}')
+            started = time()
+            dump_world(filename, classes, 0)
+            print(
+                f'{ext}: dumped {os.path.getsize(filename)} bytes in '
+                f'{time() - started:.2f} seconds.'
+            )
+            filenames.append(filename)
+        for ext, filename in zip(args.formats, filenames):
+            reset()
+            started = time()
+            load_world(filename, classes)
+            print(f'{ext}: loaded in {time() - started:.2f} seconds.')
+
+
+if __name__ == '__main__':
+    main(parser.parse_args())